@@ -0,0 +1,193 @@
+# Asset pipeline: the background and every ball sprite are baked, already
+# scaled, into one atlas PNG next to this script. The atlas file name carries
+# a hash of the source images and target sizes, so it's rebuilt only when an
+# asset changes. The hash is cached in a stamp file against each source's size
+# and mtime, so an ordinary launch only stats the sources. Startup then decodes
+# a single small image instead of the full-resolution sources, and other sizes
+# are scaled from it on first use.
+import hashlib
+import os
+
+import pygame
+
+from levels import RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+ATLAS_PREFIX = "sprite_atlas-"
+ATLAS_VERSION = 1
+STAMP_FILE = "sprite_atlas.stamp"
+
+BACKGROUND_FILE = "background.png"
+color_to_filename = {
+    RED: "red_ball.png",
+    BLUE: "blue_ball.png",
+    YELLOW: "yellow_ball.png",
+    PURPLE: "purple_ball.png",
+    ORANGE: "orange_ball.png",
+    CYAN: "cyan_ball.png",
+    GREEN: "green_ball.png",
+    LIGHT_BLUE: "light_blue_ball.png",
+    GRAY: "gray_ball.png",
+    BLACK: "black_ball.png",
+}
+
+
+def asset_path(filename):
+    return os.path.join(ASSET_DIR, filename)
+
+
+# Load a single image relative to this module, scaled to size, or None if
+# it's missing
+def load_image(filename, size):
+    path = asset_path(filename)
+    if not os.path.exists(path):
+        return None
+    return pygame.transform.scale(pygame.image.load(path), size)
+
+
+# Atlas layout: the background (if present) at the top-left, then one row of
+# ball cells in color_to_filename order, skipping missing files
+def _layout(ball_size, background_size):
+    has_background = os.path.exists(asset_path(BACKGROUND_FILE))
+    colors = [color for color, filename in color_to_filename.items() if os.path.exists(asset_path(filename))]
+    top = background_size[1] if has_background else 0
+    cells = {color: pygame.Rect(i * ball_size[0], top, ball_size[0], ball_size[1]) for i, color in enumerate(colors)}
+    width = max(background_size[0] if has_background else 0, len(colors) * ball_size[0], 1)
+    height = max(top + (ball_size[1] if colors else 0), 1)
+    background = pygame.Rect(0, 0, background_size[0], background_size[1]) if has_background else None
+    return (width, height), background, cells
+
+
+def source_files():
+    return [BACKGROUND_FILE] + list(color_to_filename.values())
+
+
+def content_key(ball_size, background_size):
+    digest = hashlib.sha1(f"{ATLAS_VERSION}:{ball_size}:{background_size}".encode())
+    for filename in source_files():
+        path = asset_path(filename)
+        if os.path.exists(path):
+            digest.update(filename.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+# Size and mtime of every source that exists, plus the target sizes. While
+# this matches the stamp, the sources are taken to be unchanged.
+def source_signature(ball_size, background_size):
+    parts = [f"{ATLAS_VERSION}:{ball_size}:{background_size}"]
+    for filename in source_files():
+        try:
+            stat = os.stat(asset_path(filename))
+        except OSError:
+            continue
+        parts.append(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}")
+    return ";".join(parts)
+
+
+# Content hash of the sources, read from the stamp when their sizes and
+# mtimes haven't changed and recomputed (and restamped) when they have
+def atlas_key(ball_size, background_size):
+    signature = source_signature(ball_size, background_size)
+    try:
+        with open(asset_path(STAMP_FILE)) as f:
+            stamped, key = f.read().splitlines()
+        if stamped == signature:
+            return key
+    except (OSError, ValueError):
+        pass  # No stamp yet, or a damaged one
+    key = content_key(ball_size, background_size)
+    try:
+        with open(asset_path(STAMP_FILE), "w") as f:
+            f.write(f"{signature}\n{key}\n")
+    except OSError:
+        pass  # Read-only install: hash again next launch
+    return key
+
+
+def compose_atlas(ball_size, background_size):
+    atlas_size, background_rect, cells = _layout(ball_size, background_size)
+    atlas = pygame.Surface(atlas_size, pygame.SRCALPHA)
+    if background_rect:
+        atlas.blit(load_image(BACKGROUND_FILE, background_size), background_rect)
+    for color, rect in cells.items():
+        atlas.blit(load_image(color_to_filename[color], ball_size), rect)
+    return atlas
+
+
+def build_atlas(ball_size, background_size):
+    atlas = compose_atlas(ball_size, background_size)
+    path = asset_path(f"{ATLAS_PREFIX}{atlas_key(ball_size, background_size)}.png")
+    pygame.image.save(atlas, path)
+    # Drop atlases baked from older assets
+    for filename in os.listdir(ASSET_DIR):
+        if filename.startswith(ATLAS_PREFIX) and asset_path(filename) != path:
+            os.remove(asset_path(filename))
+    return path
+
+
+class SpriteAtlas:
+    def __init__(self, ball_size, background_size):
+        # Sizes the atlas is baked at, and the sizes currently asked for
+        self.baked_sizes = (tuple(ball_size), tuple(background_size))
+        self.ball_size = tuple(ball_size)
+        self.background_size = tuple(background_size)
+        self.surface = None
+        self.cells = {}
+        self.background_rect = None
+        self.scaled = {}
+
+    # Decode the atlas, baking it first if the assets changed
+    def load(self):
+        if self.surface is not None:
+            return
+        ball_size, background_size = self.baked_sizes
+        _, self.background_rect, self.cells = _layout(ball_size, background_size)
+        path = asset_path(f"{ATLAS_PREFIX}{atlas_key(ball_size, background_size)}.png")
+        if os.path.exists(path):
+            surface = pygame.image.load(path)
+        else:
+            try:
+                surface = pygame.image.load(build_atlas(ball_size, background_size))
+            except (OSError, pygame.error):
+                # Read-only install: bake in memory instead
+                surface = compose_atlas(ball_size, background_size)
+        self.surface = surface.convert_alpha() if pygame.display.get_surface() else surface
+        self.scaled.clear()
+
+    # Sprite for a ball color at the given size, or None if its file is
+    # missing. Sizes other than the baked one are scaled once and kept.
+    def ball(self, color, size=None):
+        self.load()
+        size = tuple(size or self.ball_size)
+        key = (color, size)
+        if key not in self.scaled:
+            rect = self.cells.get(color)
+            sprite = None
+            if rect is not None:
+                sprite = self.surface.subsurface(rect)
+                if size != self.baked_sizes[0]:
+                    sprite = pygame.transform.smoothscale(sprite, size)
+            self.scaled[key] = sprite
+        return self.scaled[key]
+
+    def background(self, size=None):
+        self.load()
+        size = tuple(size or self.background_size)
+        key = ("background", size)
+        if key not in self.scaled:
+            sprite = None
+            if self.background_rect is not None:
+                sprite = self.surface.subsurface(self.background_rect)
+                if size != self.baked_sizes[1]:
+                    sprite = pygame.transform.smoothscale(sprite, size)
+            self.scaled[key] = sprite
+        return self.scaled[key]
+
+    # Call after a window resize or DPI change; scaled copies are rebuilt on
+    # the next lookup
+    def rescale(self, ball_size=None, background_size=None):
+        self.ball_size = tuple(ball_size or self.ball_size)
+        self.background_size = tuple(background_size or self.background_size)
+        self.scaled.clear()
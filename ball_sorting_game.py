@@ -2,94 +2,238 @@ import pygame
 import sys
 import random
 import time
-import os
 import math
+import os
+import getpass
+import sqlite3
+import threading
+
+from assets import SpriteAtlas, color_to_filename, load_image
+from bot import BotPlayer
+from engine import CAPACITY, deal, level_capacity
+from hints import HintService, PENDING, TOO_BIG, UNSOLVABLE
+from hit_index import HitGrid
+from layout import GridLayout
+from level_generator import level_deal, open_deal_file
+from levels import (WHITE, BLACK, RED, BLUE, YELLOW, GRAY, GREEN, PURPLE, ORANGE, CYAN,
+                    LIGHT_BLUE, LEVELS, TIME_LIMIT)
+from profiler import FrameProfiler
+from replay import ReplayRecorder, WIN, ILLEGAL_DROP, STUCK, OUT_OF_MOVES, TIME_UP
+from stats_store import StatsStore
+from text_cache import TextCache
+
+try:
+    from particles import ParticleSystem
+except ImportError:  # NumPy missing: animate the start screen one ball at a time
+    ParticleSystem = None
 
-# Initialize Pygame
-pygame.init()
+# Nothing at module level starts a pygame subsystem, touches the disk or
+# starts a thread, so tools and benchmarks can import this module freely.
+# main() opens the window and shows the start screen straight away; the play
+# screen's assets and the services behind it load on a background thread
+# while the start screen runs.
 
-# Set up the display
+# Display, opened by init_display()
 WIDTH = 600
 HEIGHT = 600
-WINDOW = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Ball Sorting Game")
-
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-BLUE = (0, 0, 255)
-YELLOW = (255, 255, 0)
-GRAY = (200, 200, 200)
-GREEN = (0, 255, 0)
-PURPLE = (128, 0, 128)
-ORANGE = (255, 165, 0)
-CYAN = (0, 255, 255)
-LIGHT_BLUE = (173, 216, 230)
-
-# Define levels
-LEVELS = [
-    {"colors": [RED, BLUE, YELLOW], "balls_per_color": 2, "compartments": 4, "move_limit": None},
-    {"colors": [RED, BLUE, YELLOW, PURPLE], "balls_per_color": 2, "compartments": 5, "move_limit": None},
-    {"colors": [RED, BLUE, YELLOW, PURPLE], "balls_per_color": 3, "compartments": 5, "move_limit": None},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE], "balls_per_color": 3, "compartments": 6, "move_limit": 30},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN], "balls_per_color": 4, "compartments": 7, "move_limit": 40},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN], "balls_per_color": 4, "compartments": 8, "move_limit": 45},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE], "balls_per_color": 4, "compartments": 9, "move_limit": 50},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY], "balls_per_color": 4, "compartments": 10, "move_limit": 55},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK], "balls_per_color": 4, "compartments": 11, "move_limit": 60},
-    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK], "balls_per_color": 5, "compartments": 12, "move_limit": 70},
-]
-
-# Load assets
-BASE_PATH = r"C:\Users\me\Documents\python"
-BACKGROUND = pygame.image.load(os.path.join(BASE_PATH, "background.png")) if os.path.exists(os.path.join(BASE_PATH, "background.png")) else None
-if BACKGROUND:
-    BACKGROUND = pygame.transform.scale(BACKGROUND, (WIDTH, HEIGHT))
-LOGO = pygame.image.load(os.path.join(BASE_PATH, "super_seed_logo.png")) if os.path.exists(os.path.join(BASE_PATH, "super_seed_logo.png")) else None
-if LOGO:
-    LOGO = pygame.transform.scale(LOGO, (200, 50))
+# "capped" paces frames with the clock at 60 fps, "vsync" paces them to the
+# display, "uncapped" renders as fast as possible and "reduced" caps animation
+# at REDUCED_FPS to save CPU. vsync is opt-in: pygame only offers it on a
+# SCALED window, which it enlarges by the largest whole factor that fits the
+# desktop (600x600 becomes 1200x1200 on a 1440p screen).
+RENDER_MODE = "capped"
+REDUCED_FPS = 30
+VSYNC = False
+WINDOW = None
 
 # Game settings
 COMPARTMENT_SIZE = 80
 BALL_RADIUS = 15
 BALL_SIZE = (BALL_RADIUS * 2, BALL_RADIUS * 2)  # Size for scaling images (30x30 pixels)
-TIME_LIMIT = 180
+BALL_SPACING = COMPARTMENT_SIZE // 6
+# Tubes are drawn in this part of the window, under the HUD; boards taller
+# than it scroll with the mouse wheel or the arrow and page keys
+BOARD_VIEW = pygame.Rect(0, 70, WIDTH, HEIGHT - 70)
+SCROLL_STEP = 40
+DIRTY_RECTS = True  # Repaint only changed regions of the play screen
+IDLE_FPS = 20  # Frame rate while nothing on the play screen is animating
+START_SCREEN_BALLS = 10  # Bouncing balls behind the start screen text
 
-# Load ball images
+# Animation (start screen balls, bot pacing) advances in fixed steps,
+# independent of the frame rate. The level timer is wall-clock time, so a
+# stall still counts against the player.
+SIM_DT = 1 / 60
+MAX_FRAME_TIME = 0.25  # Longer stalls are dropped from animation rather than caught up
+
+# Sprites come from the pre-scaled sprite atlas next to this script, which is
+# only decoded when the first one is asked for
+ASSETS = SpriteAtlas(BALL_SIZE, (WIDTH, HEIGHT))
 BALL_IMAGES = {}
-color_to_filename = {
-    RED: "red_ball.png",
-    BLUE: "blue_ball.png",
-    YELLOW: "yellow_ball.png",
-    PURPLE: "purple_ball.png",
-    ORANGE: "orange_ball.png",
-    CYAN: "cyan_ball.png",
-    GREEN: "green_ball.png",
-    LIGHT_BLUE: "light_blue_ball.png",
-    GRAY: "gray_ball.png",
-    BLACK: "black_ball.png",
-}
-
-for color, filename in color_to_filename.items():
-    file_path = os.path.join(BASE_PATH, filename)
-    if os.path.exists(file_path):
-        image = pygame.image.load(file_path).convert_alpha()
-        BALL_IMAGES[color] = pygame.transform.scale(image, BALL_SIZE)
-    else:
-        print(f"Warning: {filename} not found. Using default circle for color {color}.")
-        BALL_IMAGES[color] = None  # Fallback to drawing a circle if image is missing
+BACKGROUND = None
+LOGO = None
+
+# Verified deals written by level_generator.py, if present
+DEALS = None
 
-# Fonts
-FONT = pygame.font.SysFont("Arial", 30)
-NOTIFICATION_FONT = pygame.font.SysFont("Arial", 40)
-SMALL_FONT = pygame.font.SysFont("Arial", 20)
+# Frame-time profiler: F3 toggles the overlay, F4 writes CSV and Chrome trace
+# files under profiles/
+PROFILER = FrameProfiler(enabled=True)
+SHOW_PROFILER = False
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+profiler_lines = None
+
+# Each level attempt is appended to a replay log under replays/
+RECORD_REPLAYS = True
+RECORDER = None
+
+# Progress, results and best times are kept in progress.db next to this script
+PERSIST_STATS = True
+STORE = None
+try:
+    PLAYER_NAME = getpass.getuser()
+except Exception:  # No login name in this environment
+    PLAYER_NAME = "player"
+
+# Hints (H) come from a solver on a background thread that is handed every
+# new board as soon as it appears
+HINTS = None
+
+# The bot (B) plays the current level by itself, thinking for at most
+# BOT_BUDGET seconds a frame and moving every BOT_MOVE_TICKS simulation steps.
+# Left alone on the start screen for ATTRACT_DELAY seconds, the game plays
+# demo levels with it until a key is pressed or the mouse clicked.
+BOT = None
+BOT_BUDGET = 0.002
+BOT_MOVE_TICKS = 30
+ATTRACT_DELAY = 30
+ATTRACT_PAUSE_TICKS = 180  # Steps a finished demo level stays up
+
+# Fonts, loaded with the window
+FONT = None
+NOTIFICATION_FONT = None
+SMALL_FONT = None
+
+# Cache for rendered text and wrapped layouts
+TEXT = TextCache()
 
 # Text constants
 WRITEUP_TEXT = "This project is designed by Biodun (https://x.com/janetwoss) to participate in SuperSeed Tesla powered by SuperSeed the only loan payback."
 START_NOTE = "Keep clicking to start game"
 HEART_EMOJI = "❤️"
 
+# Open the window. Only the display and font subsystems are started; the
+# game has no sound or controller input to initialize.
+def init_display():
+    global WINDOW, VSYNC, FONT, NOTIFICATION_FONT, SMALL_FONT
+    pygame.display.init()
+    pygame.font.init()
+    if RENDER_MODE == "vsync":
+        try:
+            WINDOW = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED, vsync=1)
+            VSYNC = True
+        except pygame.error:
+            pass  # No vsync on this driver; frames are capped by the clock instead
+    if not VSYNC:
+        WINDOW = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
+    pygame.display.set_caption("Ball Sorting Game")
+    FONT = pygame.font.SysFont("Arial", 30)
+    NOTIFICATION_FONT = pygame.font.SysFont("Arial", 40)
+    SMALL_FONT = pygame.font.SysFont("Arial", 20)
+
+# Ball sprites are on the start screen as well as the board, so they load
+# with the window
+def load_ball_images():
+    for color, filename in color_to_filename.items():
+        BALL_IMAGES[color] = ASSETS.ball(color)
+        if BALL_IMAGES[color] is None:
+            print(f"Warning: {filename} not found. Using default circle for color {color}.")
+
+def load_play_assets():
+    global BACKGROUND, LOGO
+    BACKGROUND = ASSETS.background()
+    LOGO = load_image("super_seed_logo.png", (200, 50))
+
+# Window events that can change its size: a resize by the player, or the OS
+# rescaling it for a screen with a different DPI
+RESIZE_EVENTS = {pygame.VIDEORESIZE, pygame.WINDOWSIZECHANGED, pygame.WINDOWDISPLAYCHANGED}
+
+# The layout stays WIDTH x HEIGHT at the top left of a resized window, which
+# is kept at least that big; the background is rescaled to cover all of it.
+# A vsync window is SCALED, so pygame stretches the whole canvas instead.
+def resize_window():
+    global WINDOW, BACKGROUND
+    if VSYNC:
+        return
+    width, height = pygame.display.get_window_size()
+    size = (max(width, WIDTH), max(height, HEIGHT))
+    if size != (width, height):
+        WINDOW = pygame.display.set_mode(size, pygame.RESIZABLE)
+    else:
+        WINDOW = pygame.display.get_surface()
+    if size == ASSETS.background_size:
+        return
+    wait_for_gameplay()  # The loader may still be reading the old background
+    ASSETS.rescale(background_size=size)
+    BACKGROUND = ASSETS.background()
+    if renderer:
+        renderer.resize()
+
+# Replays and saved stats are optional: if their files can't be written (a
+# read-only install, say) the game runs without that feature
+def start_services():
+    global DEALS, RECORDER, STORE, HINTS, BOT
+    DEALS = open_deal_file()
+    if DEALS is None:
+        print("Warning: no deal file, so each level's deal is generated as it starts "
+              "(run level_generator.py to build deals.bin).")
+    RECORDER = None
+    if RECORD_REPLAYS:
+        recorder = ReplayRecorder()
+        replay_dir = os.path.dirname(recorder.path)
+        try:
+            os.makedirs(replay_dir, exist_ok=True)
+            if not os.access(replay_dir, os.W_OK):
+                raise PermissionError(f"{replay_dir} is not writable")
+            RECORDER = recorder
+        except OSError as exc:
+            print(f"Warning: replays are off ({exc}).")
+    STORE = None
+    if PERSIST_STATS:
+        try:
+            STORE = StatsStore()
+        except (sqlite3.Error, OSError) as exc:
+            print(f"Warning: progress and best times won't be saved ({exc}).")
+    HINTS = HintService()
+    BOT = BotPlayer()
+
+# Everything the play screen needs beyond the start screen, loaded on a
+# background thread. wait_for_gameplay() blocks until it is done, and
+# re-raises anything that went wrong on the thread.
+def load_gameplay():
+    load_play_assets()
+    start_services()
+
+def run_loader():
+    global loader_error
+    try:
+        load_gameplay()
+    except Exception as exc:
+        loader_error = exc
+
+def start_loading():
+    global loader
+    loader = threading.Thread(target=run_loader, name="gameplay-loader", daemon=True)
+    loader.start()
+
+def wait_for_gameplay():
+    global loader, loader_error
+    if loader is not None:
+        loader.join()
+        loader = None
+    if loader_error is not None:
+        error, loader_error = loader_error, None
+        raise error
+
 # BallAnimation class for bouncing balls on the start screen
 class BallAnimation:
     def __init__(self, x, y, color):
@@ -100,8 +244,14 @@ class BallAnimation:
         self.speed_x = random.uniform(-3, 3)  # Random horizontal speed
         self.speed_y = random.uniform(-3, 3)  # Random vertical speed
         self.angle = random.uniform(0, 2 * math.pi)  # For slight wobble effect
+        self.prev_x = x
+        self.prev_y = y
 
+    # One fixed simulation step (SIM_DT)
     def update(self):
+        self.prev_x = self.x
+        self.prev_y = self.y
+
         # Update position
         self.x += self.speed_x
         self.y += self.speed_y
@@ -119,11 +269,15 @@ class BallAnimation:
             self.speed_y = -self.speed_y
             self.y = max(self.radius, min(self.y, HEIGHT - self.radius))
 
-    def draw(self):
+    # Draw between the last two simulation steps; alpha is how far into the
+    # next step the frame falls
+    def draw(self, alpha=1.0):
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
         if BALL_IMAGES[self.color] is not None:
-            WINDOW.blit(BALL_IMAGES[self.color], (int(self.x - self.radius), int(self.y - self.radius)))
+            WINDOW.blit(BALL_IMAGES[self.color], (int(x - self.radius), int(y - self.radius)))
         else:
-            pygame.draw.circle(WINDOW, self.color, (int(self.x), int(self.y)), self.radius)
+            pygame.draw.circle(WINDOW, self.color, (int(x), int(y)), self.radius)
 
 # Button class
 class Button:
@@ -169,95 +323,279 @@ class Toggle:
         return self.rect.collidepoint(pos)
 
 # Compartment class
+# The balls live in the engine board; a compartment only knows where its tube
+# sits on screen and how to draw it.
+# Positions are in board coordinates; scroll is how far the board has been
+# scrolled up the screen.
 class Compartment:
-    def __init__(self, x, y):
+    def __init__(self, x, y, index, capacity=CAPACITY):
         self.x = x
         self.y = y
-        self.balls = []
+        self.index = index
+        self.capacity = capacity
+        # Tubes taller than the default grow by one ball spacing per extra slot
+        self.height = COMPARTMENT_SIZE + max(0, capacity - CAPACITY) * BALL_SPACING
 
-    def draw(self):
-        pygame.draw.rect(WINDOW, WHITE, (self.x, self.y, COMPARTMENT_SIZE, COMPARTMENT_SIZE))
-        pygame.draw.rect(WINDOW, BLACK, (self.x, self.y, COMPARTMENT_SIZE, COMPARTMENT_SIZE), 2)
-        
-        ball_spacing = COMPARTMENT_SIZE // 6
-        for i, (color, _) in enumerate(self.balls):
-            ball_x = self.x + COMPARTMENT_SIZE // 2 - BALL_RADIUS  # Center the image
-            ball_y = self.y + COMPARTMENT_SIZE - BALL_RADIUS - (i * ball_spacing) - BALL_RADIUS
-            if BALL_IMAGES[color] is not None:
-                WINDOW.blit(BALL_IMAGES[color], (ball_x, ball_y))
-            else:
-                # Fallback to circle if image not found
-                pygame.draw.circle(WINDOW, color, (ball_x + BALL_RADIUS, ball_y + BALL_RADIUS), BALL_RADIUS)
-            self.balls[i] = (color, (ball_x + BALL_RADIUS, ball_y + BALL_RADIUS))
-
-    def can_add_ball(self, color):
-        return len(self.balls) == 0 or (all(ball[0] == color for ball in self.balls) and len(self.balls) < 5)
-
-    def can_remove_ball(self, color):
-        return len(self.balls) > 0
+    def ball_position(self, i):
+        return (self.x + COMPARTMENT_SIZE // 2, self.y + self.height - BALL_RADIUS - (i * BALL_SPACING))
+
+    # Board area covered by the frame and a full stack of balls
+    def bounds(self):
+        top_x, top_y = self.ball_position(self.capacity - 1)
+        rect = pygame.Rect(self.x, self.y, COMPARTMENT_SIZE, self.height)
+        return rect.union(pygame.Rect(top_x - BALL_RADIUS, top_y - BALL_RADIUS, BALL_SIZE[0], BALL_SIZE[1]))
+
+    def contains(self, x, y):
+        return self.x <= x <= self.x + COMPARTMENT_SIZE and self.y <= y <= self.y + self.height
+
+    def draw_frame(self, surface, scroll=0):
+        rect = (self.x, self.y - scroll, COMPARTMENT_SIZE, self.height)
+        pygame.draw.rect(surface, WHITE, rect)
+        pygame.draw.rect(surface, BLACK, rect, 2)
+
+    def draw_balls(self, surface, board, palette, scroll=0):
+        with PROFILER.section("compartment.draw"):
+            for i, color_index in enumerate(board.tubes[self.index]):
+                x, y = self.ball_position(i)
+                draw_ball(surface, palette[color_index], (x, y - scroll))
+
+    def draw(self, board, palette):
+        self.draw_frame(WINDOW)
+        self.draw_balls(WINDOW, board, palette)
+
+    def can_remove_ball(self, board):
+        return len(board.tubes[self.index]) > 0
+
+# Draw a ball centered on pos, falling back to a circle if its image is missing
+def draw_ball(surface, color, pos):
+    image = BALL_IMAGES.get(color)
+    if image is not None:
+        surface.blit(image, (pos[0] - BALL_RADIUS, pos[1] - BALL_RADIUS))
+    else:
+        pygame.draw.circle(surface, color, pos, BALL_RADIUS)
+
+# Dirty-rectangle renderer for the play screen. The background, logo and empty
+# compartment frames are composited once into a static layer. Each frame only
+# the regions that changed (moved tubes, the dragged ball, HUD text) are
+# restored from it and redrawn, and just those rects get pushed to the display.
+# Only the compartments inside BOARD_VIEW at the current scroll are ever
+# drawn or checked for changes.
+class BoardRenderer:
+    def __init__(self, compartments, layout):
+        self.compartments = compartments
+        self.layout = layout
+        self.bounds = [compartment.bounds() for compartment in compartments]
+        self.max_scroll = max(0, layout.bottom() + 20 - HEIGHT)
+        self.scroll = 0
+        self.static = pygame.Surface(WINDOW.get_size()).convert()
+        self.build_static()
+
+    # Rebuild the static layer at the new window size
+    def resize(self):
+        self.static = pygame.Surface(WINDOW.get_size()).convert()
+        self.build_static()
+
+    def build_static(self):
+        if BACKGROUND:
+            self.static.blit(BACKGROUND, (0, 0))
+        else:
+            self.static.fill(WHITE)
+        self.visible = self.layout.visible(BOARD_VIEW.x, BOARD_VIEW.y + self.scroll, BOARD_VIEW.width, BOARD_VIEW.height)
+        self.static.set_clip(BOARD_VIEW)
+        for index in self.visible:
+            self.compartments[index].draw_frame(self.static, self.scroll)
+        self.static.set_clip(None)
+        if LOGO:
+            self.static.blit(LOGO, (WIDTH // 2 - LOGO.get_width() // 2, 10))
+        self.tubes = None
+        self.overlays = []
+
+    def scroll_by(self, delta):
+        scroll = max(0, min(self.max_scroll, self.scroll + delta))
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self.build_static()
+
+    # Force the next draw to repaint the whole screen
+    def invalidate(self):
+        self.tubes = None
+
+    def screen_bounds(self, index):
+        return self.bounds[index].move(0, -self.scroll)
+
+    @staticmethod
+    def overlay_rect(overlay):
+        if overlay[0] == "ball":
+            x, y = overlay[2]
+            return pygame.Rect(x - BALL_RADIUS, y - BALL_RADIUS, BALL_SIZE[0], BALL_SIZE[1])
+        if overlay[0] == "frame":
+            return overlay[2]
+        return overlay[1].get_rect(topleft=overlay[2])
+
+    # overlays are ("ball", color, center), ("text", surface, topleft) or
+    # ("frame", color, rect), drawn over the board in order. Returns the rects
+    # that were repainted.
+    def draw(self, board, palette, overlays):
+        if self.tubes is None:
+            damaged = [WINDOW.get_rect()]
+        else:
+            damaged = [self.screen_bounds(index).clip(BOARD_VIEW) for index in self.visible
+                       if board.tubes[index] != self.tubes[index]]
+            damaged += [self.overlay_rect(overlay) for overlay in self.overlays if overlay not in overlays]
+            damaged += [self.overlay_rect(overlay) for overlay in overlays if overlay not in self.overlays]
+        self.tubes = board.tubes
+        self.overlays = overlays
+
+        for rect in damaged:
+            WINDOW.set_clip(rect)
+            WINDOW.blit(self.static, rect, rect)
+            WINDOW.set_clip(rect.clip(BOARD_VIEW))
+            for index in self.visible:
+                if self.screen_bounds(index).colliderect(rect):
+                    self.compartments[index].draw_balls(WINDOW, board, palette, self.scroll)
+            WINDOW.set_clip(rect)
+            for overlay in overlays:
+                if overlay[0] == "ball":
+                    draw_ball(WINDOW, overlay[1], overlay[2])
+                elif overlay[0] == "frame":
+                    pygame.draw.rect(WINDOW, overlay[1], overlay[2], 3)
+                else:
+                    WINDOW.blit(overlay[1], overlay[2])
+        WINDOW.set_clip(None)
+        return damaged
+
+# Lay out a HUD line from cached label segments and glyph-atlas numbers. Each
+# segment is its own overlay, so only the digits that changed get repainted.
+def hud_overlays(segments, color, pos):
+    x, y = pos
+    overlays = []
+    for field, (text, numeric) in enumerate(segments):
+        surface = TEXT.render_glyphs(FONT, text, color, field) if numeric else TEXT.render(FONT, text, color)
+        overlays.append(("text", surface, (x, y)))
+        x += surface.get_width()
+    return overlays
+
+# Profiler overlay, one line per timed section in the bottom-left corner.
+# The text is refreshed twice a second rather than every frame.
+def profiler_overlays():
+    global profiler_lines
+    if profiler_lines is None or PROFILER.frame % 30 == 0:
+        profiler_lines = [TEXT.render(SMALL_FONT, line, BLACK) for line in PROFILER.summary_lines()]
+    top = HEIGHT - 5 - 20 * len(profiler_lines)
+    return [("text", surface, (5, top + i * 20)) for i, surface in enumerate(profiler_lines)]
+
+# Hint overlays for the current board: the two compartments of the next move
+# outlined, or a note while the solver is still working
+def hint_overlays():
+    result = HINTS.hint(board)
+    if result == PENDING:
+        return [("text", TEXT.render(SMALL_FONT, "Hint: thinking...", BLACK), (10, 45))]
+    if result == UNSOLVABLE:
+        return [("text", TEXT.render(SMALL_FONT, "Hint: no solution from here", RED), (10, 45))]
+    if result == TOO_BIG:
+        return [("text", TEXT.render(SMALL_FONT, "Hint: too many positions to search", RED), (10, 45))]
+    src, dst = result
+    return [("frame", GREEN, renderer.screen_bounds(src).inflate(6, 6)),
+            ("frame", ORANGE, renderer.screen_bounds(dst).inflate(6, 6))]
+
+# Seconds since the current level was dealt
+def level_clock():
+    return time.perf_counter() - level_start
+
+# Drop the top ball of tube src on tube dst, for a click or the bot
+def play_move(src, dst):
+    global board, move_count, game_over
+    if RECORDER and not attract:
+        RECORDER.move(src, dst, level_clock())
+    if board.is_legal(src, dst):
+        history.append((board, move_count))
+        future.clear()
+        board = board.apply_move(src, dst)
+        move_count += 1
+    else:
+        game_over = True
+        finish_level(ILLEGAL_DROP, level_clock())
+
+# Undo and redo swap whole boards between two stacks; nothing is re-dealt
+def undo():
+    global board, move_count, selected_ball, following
+    if history:
+        future.append((board, move_count))
+        board, move_count = history.pop()
+        selected_ball = None
+        following = False
+        if RECORDER:
+            RECORDER.undo(level_clock())
+
+def redo():
+    global board, move_count, selected_ball, following
+    if future:
+        history.append((board, move_count))
+        board, move_count = future.pop()
+        selected_ball = None
+        following = False
+        if RECORDER:
+            RECORDER.redo(level_clock())
+
+def export_profile():
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, time.strftime("frames-%Y%m%d-%H%M%S"))
+    PROFILER.export_csv(stem + ".csv")
+    PROFILER.export_chrome_trace(stem + ".json")
+    print(f"Wrote {stem}.csv and {stem}.json")
+
+# Grid for a board: up to 6 tubes in 2 rows, otherwise 3 rows, adding rows
+# (and scrolling) once the columns no longer fit the window width
+def layout_board(num_compartments, capacity):
+    height = Compartment(0, 0, 0, capacity).height
+    if num_compartments <= 6:
+        cols, gap_x, gap_y, top = (num_compartments + 1) // 2, 20, 50, 150
+    else:
+        gap_x, gap_y, top = 10, 20, 100
+        cols = min((num_compartments + 2) // 3, WIDTH // (COMPARTMENT_SIZE + gap_x))
+    left = (WIDTH - cols * (COMPARTMENT_SIZE + gap_x)) // 2
+    return GridLayout(num_compartments, cols, left, top, COMPARTMENT_SIZE + gap_x, height + gap_y,
+                      COMPARTMENT_SIZE, height)
 
 # Initialize level function
-def initialize_level(level):
-    level_data = LEVELS[level - 1]
+# level_data overrides the built-in level, e.g. for boards from make_level
+# Returns the deal's id along with the board: the seed of the deal file entry
+# it came from, or seed itself for a deal generated on the spot. Plays of one
+# deal share it.
+def initialize_level(level, seed=None, level_data=None):
+    custom = level_data is not None
+    if not custom:
+        level_data = LEVELS[level - 1]
     num_compartments = level_data["compartments"]
-    compartments = []
+    capacity = level_capacity(level_data)
+    layout = layout_board(num_compartments, capacity)
+    compartments = [Compartment(*layout.position(index), index, capacity) for index in range(num_compartments)]
 
-    if num_compartments <= 6:
-        rows = 2
-        cols = (num_compartments + 1) // 2
-        for row in range(rows):
-            for col in range(cols):
-                if row * cols + col < num_compartments:
-                    x = col * (COMPARTMENT_SIZE + 20) + (WIDTH - (cols * (COMPARTMENT_SIZE + 20))) // 2
-                    y = row * (COMPARTMENT_SIZE + 50) + 150
-                    compartments.append(Compartment(x, y))
+    # A verified deal from the deal file, or one generated from the seed
+    if custom:
+        deal_id, board = seed, deal(level_data, random.Random(seed) if seed is not None else None)
     else:
-        rows = 3
-        cols = (num_compartments + 2) // 3
-        for row in range(rows):
-            for col in range(cols):
-                if row * cols + col < num_compartments:
-                    x = col * (COMPARTMENT_SIZE + 10) + (WIDTH - (cols * (COMPARTMENT_SIZE + 10))) // 2
-                    y = row * (COMPARTMENT_SIZE + 20) + 100
-                    compartments.append(Compartment(x, y))
-
-    balls = []
-    for color in level_data["colors"]:
-        for _ in range(level_data["balls_per_color"]):
-            balls.append(color)
-    random.shuffle(balls)
-    num_balls = len(balls)
-    num_filled_compartments = min(len(compartments) - 1, (num_balls + 4 - 1) // 4)
-    for i, ball in enumerate(balls):
-        compartment = compartments[i % num_filled_compartments]
-        compartment.balls.append((ball, (0, 0)))
-    return compartments
-
-# is_stuck function
-def is_stuck(compartments):
-    has_empty = any(len(compartment.balls) == 0 for compartment in compartments)
-    if has_empty:
-        return False
-    for i, source in enumerate(compartments):
-        if not source.balls:
-            continue
-        top_ball_color = source.balls[-1][0]
-        for j, target in enumerate(compartments):
-            if i == j:
-                continue
-            if target.can_add_ball(top_ball_color):
-                return False
-    return True
+        deal_id, board = level_deal(level, seed, DEALS)
+    # Picking and dropping look compartments up by position in this grid
+    hit_grid = HitGrid([compartment.bounds() for compartment in compartments], COMPARTMENT_SIZE)
+    return compartments, board, hit_grid, layout, deal_id
 
 # Game variables
 game_started = False
-start_button = Button(WIDTH // 2 - 50, HEIGHT // 2 + 100, 100, 50, "OK", GREEN)
-start_toggle = Toggle(WIDTH // 2 - 50, HEIGHT // 2 + 50, 100, 30, max_clicks=5)
+loader = None  # Thread loading the play screen, until it has been waited for
+loader_error = None
 current_level = 1
 compartments = None
+hit_grid = None
+layout = None
+board = None
+checked_board = None
+renderer = None
+palette = None
 selected_ball = None
 following = False
-start_time = 0
+level_start = 0  # time.perf_counter() when the current level was dealt
+elapsed_time = 0
 game_won = False
 time_up = False
 game_over = False
@@ -265,254 +603,462 @@ win_popup = False
 win_time = 0
 move_count = 0
 move_limit = None
+history = []  # (board, move_count) before each move, for undo
+future = []   # states undone, for redo
+hint_board = None  # board a hint was asked for; hidden once the board changes
 lives = 1
+level_seed = 0  # seeds the deal; what replays record
+deal_id = 0  # which deal that gave; what results are grouped by
+win_record = None
+bot_playing = False
+bot_assisted = False  # the bot moved this level, so it earns no life or record
+bot_ticks = 0  # Simulation steps since the bot's last move
+attract = False  # Playing demo levels from the start screen
+idle_ticks = 0  # Simulation steps since the last input on the start screen
 running = True
 
-# Buttons
-end_button = Button(150, 450, 100, 50, "End Game", GREEN)
-restart_button = Button(350, 450, 100, 50, "Restart", GREEN)
-next_level_button = Button(200, 350, 100, 50, "Next Level", GREEN)
-exit_button = Button(300, 350, 100, 50, "Exit", GREEN)
-use_life_button = Button(250, 400, 100, 50, "Use Life", GREEN)
+# Buttons and the start screen toggle, made by load_start_screen()
+start_button = None
+start_toggle = None
+end_button = None
+restart_button = None
+next_level_button = None
+exit_button = None
+use_life_button = None
 
-# Create animated balls for the start screen
-animated_balls = []
+# Deal a level and reset the per-level state
+def start_level(level):
+    global compartments, board, hit_grid, layout, renderer, palette, level_start, move_limit, move_count
+    global game_won, time_up, game_over, win_popup, selected_ball, following
+    global level_seed, deal_id, bot_assisted
+    wait_for_gameplay()
+    level_seed = random.getrandbits(32)
+    compartments, board, hit_grid, layout, deal_id = initialize_level(level, level_seed)
+    renderer = BoardRenderer(compartments, layout)
+    palette = LEVELS[level - 1]["colors"]
+    level_start = time.perf_counter()
+    move_limit = LEVELS[level - 1]["move_limit"]
+    move_count = 0
+    history.clear()
+    future.clear()
+    game_won = False
+    time_up = False
+    game_over = False
+    win_popup = False
+    selected_ball = None
+    following = False
+    bot_assisted = False
+    if attract:
+        return
+    if RECORDER:
+        RECORDER.start(level, level_seed, board, move_limit, TIME_LIMIT)
+    if STORE:
+        STORE.save_progress(PLAYER_NAME, level, lives)
+
+# Attract mode: random levels played by the bot, with nothing recorded
+def start_demo():
+    global attract, game_started, bot_playing, bot_ticks, current_level
+    attract = True
+    game_started = True
+    bot_playing = True
+    bot_ticks = 0
+    current_level = random.randint(1, len(LEVELS))
+    start_level(current_level)
+
+def stop_demo():
+    global attract, game_started, bot_playing, current_level, lives, idle_ticks
+    attract = False
+    game_started = False
+    bot_playing = False
+    current_level = 1
+    lives = 1
+    idle_ticks = 0
+
+# Log how a level attempt ended to the replay file and the stats store.
+# Progress is saved here and at level start only, so quitting after a loss
+# can't skip its penalty: a win moves the saved level on, and a loss with no
+# lives left sends the player back to level 1.
+def finish_level(outcome, elapsed):
+    if attract:
+        return
+    if RECORDER:
+        RECORDER.finish(outcome, elapsed)
+    if not STORE:
+        return
+    if not bot_assisted:
+        STORE.record_result(PLAYER_NAME, current_level, deal_id, outcome, int(elapsed * 1000), move_count)
+    if outcome == WIN:
+        STORE.save_progress(PLAYER_NAME, min(current_level + 1, len(LEVELS)), lives)
+    elif lives == 0:
+        STORE.save_progress(PLAYER_NAME, 1, 1)
+
+# Best time and leaderboard position for the level just won, counting this win
+def win_record_text():
+    if not STORE or bot_assisted or attract:
+        return None
+    win_ms = int(win_time * 1000)
+    best = STORE.best_time(PLAYER_NAME, current_level)
+    best = win_ms if best is None else min(best, win_ms)
+    return f"Best {best / 1000:.2f}s | Rank #{STORE.rank(PLAYER_NAME, current_level, best)}"
+
+# Animated balls for the start screen
 all_colors = [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK]
-for _ in range(10):  # Create 10 bouncing balls
-    x = random.randint(BALL_RADIUS, WIDTH - BALL_RADIUS)
-    y = random.randint(BALL_RADIUS, HEIGHT - BALL_RADIUS)
-    color = random.choice(all_colors)
-    animated_balls.append(BallAnimation(x, y, color))
+animated_balls = []
+start_particles = None
+
+# Widgets and bouncing balls, once the window and fonts exist
+def load_start_screen():
+    global start_button, start_toggle, end_button, restart_button, next_level_button, exit_button
+    global use_life_button, start_particles
+    load_ball_images()
+    start_button = Button(WIDTH // 2 - 50, HEIGHT // 2 + 100, 100, 50, "OK", GREEN)
+    start_toggle = Toggle(WIDTH // 2 - 50, HEIGHT // 2 + 50, 100, 30, max_clicks=5)
+    end_button = Button(150, 450, 100, 50, "End Game", GREEN)
+    restart_button = Button(350, 450, 100, 50, "Restart", GREEN)
+    next_level_button = Button(200, 350, 100, 50, "Next Level", GREEN)
+    exit_button = Button(300, 350, 100, 50, "Exit", GREEN)
+    use_life_button = Button(250, 400, 100, 50, "Use Life", GREEN)
+    if ParticleSystem:
+        start_particles = ParticleSystem(START_SCREEN_BALLS, WIDTH, HEIGHT, BALL_RADIUS, all_colors, BALL_IMAGES)
+    else:
+        for _ in range(START_SCREEN_BALLS):
+            x = random.randint(BALL_RADIUS, WIDTH - BALL_RADIUS)
+            y = random.randint(BALL_RADIUS, HEIGHT - BALL_RADIUS)
+            color = random.choice(all_colors)
+            animated_balls.append(BallAnimation(x, y, color))
+
+def draw_start_screen(alpha):
+    WINDOW.fill(LIGHT_BLUE)
+
+    if start_particles:
+        start_particles.draw(WINDOW, alpha)
+    for ball in animated_balls:
+        ball.draw(alpha)
+
+    writeup_lines = TEXT.wrap(SMALL_FONT, WRITEUP_TEXT, WIDTH - 40)
+
+    total_height = (len(writeup_lines) + 1) * 25
+    start_y = HEIGHT // 2 - total_height // 2
+    for i, line in enumerate(writeup_lines):
+        writeup_surface = TEXT.render(SMALL_FONT, line, BLACK)
+        WINDOW.blit(writeup_surface, (WIDTH // 2 - writeup_surface.get_width() // 2, start_y + i * 25))
+
+    note_surface = TEXT.render(SMALL_FONT, START_NOTE, BLACK)
+    WINDOW.blit(note_surface, (WIDTH // 2 - note_surface.get_width() // 2, start_y + len(writeup_lines) * 25))
+
+    start_toggle.draw()
+    start_button.draw()
+
+SCROLL_KEYS = {pygame.K_UP: -SCROLL_STEP, pygame.K_DOWN: SCROLL_STEP,
+               pygame.K_PAGEUP: -BOARD_VIEW.height, pygame.K_PAGEDOWN: BOARD_VIEW.height}
+
+# Frame rate cap for the next frame, 0 for none
+def frame_cap(animating):
+    if RENDER_MODE == "uncapped":
+        return 0
+    if not animating:
+        return IDLE_FPS
+    if RENDER_MODE == "reduced":
+        return REDUCED_FPS
+    # With vsync the flip does the pacing; the cap only guards against
+    # drivers that accept vsync but don't honour it
+    return 144 if VSYNC else 60
 
 # Main game loop
-clock = pygame.time.Clock()
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-            if not game_started:
-                if start_toggle.is_clicked((mouse_x, mouse_y)):
-                    start_toggle.click()
-                if start_button.is_clicked((mouse_x, mouse_y)) and start_toggle.is_full():
-                    game_started = True
-                    compartments = initialize_level(current_level)
-                    start_time = time.time()
-                    move_limit = LEVELS[current_level - 1]["move_limit"]
-                    move_count = 0
-            elif not game_won and not time_up and not game_over:
-                if not following:
-                    for compartment in compartments:
-                        for i, (color, pos) in enumerate(compartment.balls):
+def main():
+    global running, SHOW_PROFILER, game_started, current_level, lives, hint_board, selected_ball, following
+    global elapsed_time, checked_board, game_won, win_popup, win_time, win_record, time_up, game_over
+    global bot_playing, bot_ticks, bot_assisted, idle_ticks
+    init_display()
+    load_start_screen()
+    start_loading()
+    clock = pygame.time.Clock()
+    last_time = time.perf_counter()
+    accumulator = 0.0
+    while running:
+        frame_start = time.perf_counter()
+        for event in pygame.event.get():
+            if event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                idle_ticks = 0
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type in RESIZE_EVENTS:
+                resize_window()
+            elif attract and event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                stop_demo()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                SHOW_PROFILER = not SHOW_PROFILER
+                if renderer:
+                    renderer.invalidate()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                export_profile()
+            elif event.type == pygame.MOUSEWHEEL and game_started:
+                renderer.scroll_by(-event.y * SCROLL_STEP)
+            elif event.type == pygame.KEYDOWN and game_started and event.key in SCROLL_KEYS:
+                renderer.scroll_by(SCROLL_KEYS[event.key])
+            elif event.type == pygame.KEYDOWN and game_started and not game_won and not time_up and not game_over:
+                if event.key == pygame.K_h:
+                    hint_board = board
+                elif event.key == pygame.K_z:
+                    undo()
+                elif event.key == pygame.K_y:
+                    redo()
+                elif event.key == pygame.K_b:
+                    bot_playing = not bot_playing
+                    bot_ticks = 0
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                mouse_x, mouse_y = pygame.mouse.get_pos()
+                if not game_started:
+                    if start_toggle.is_clicked((mouse_x, mouse_y)):
+                        start_toggle.click()
+                    if start_button.is_clicked((mouse_x, mouse_y)) and start_toggle.is_full():
+                        game_started = True
+                        wait_for_gameplay()
+                        # Pick up where this player left off last time
+                        saved = STORE.progress(PLAYER_NAME) if STORE else None
+                        if saved:
+                            current_level, lives = saved
+                        start_level(current_level)
+                elif not game_won and not time_up and not game_over:
+                    # Compartments are hit-tested in board coordinates, and
+                    # only inside the board view
+                    in_view = BOARD_VIEW.collidepoint(mouse_x, mouse_y)
+                    mouse_y += renderer.scroll
+                    if not following:
+                        # Only the top ball of a compartment can be picked up
+                        index = hit_grid.hit(mouse_x, mouse_y) if in_view else None
+                        compartment = compartments[index] if index is not None else None
+                        if compartment is not None and compartment.can_remove_ball(board):
+                            tube = board.tubes[compartment.index]
+                            pos = compartment.ball_position(len(tube) - 1)
                             if ((mouse_x - pos[0]) ** 2 + (mouse_y - pos[1]) ** 2) <= BALL_RADIUS ** 2:
-                                if compartment.can_remove_ball(color):
-                                    selected_ball = (compartment, i, color)
-                                    following = True
-                                    break
-                        if following:
-                            break
-                else:
-                    for target_compartment in compartments:
-                        if (target_compartment.x <= mouse_x <= target_compartment.x + COMPARTMENT_SIZE and
-                            target_compartment.y <= mouse_y <= target_compartment.y + COMPARTMENT_SIZE):
-                            color = selected_ball[2]
-                            if target_compartment.can_add_ball(color):
-                                ball = selected_ball[0].balls.pop(selected_ball[1])
-                                target_compartment.balls.append(ball)
-                                move_count += 1
-                            else:
-                                game_over = True
-                            selected_ball = None
-                            following = False
-                            break
-                    if following and not game_over:
+                                selected_ball = (compartment, tube[-1])
+                                following = True
+                    else:
+                        index = hit_grid.hit(mouse_x, mouse_y) if in_view else None
+                        target_compartment = compartments[index] if index is not None else None
+                        if target_compartment is not None and target_compartment.contains(mouse_x, mouse_y):
+                            source_compartment, color_index = selected_ball
+                            # Dropping a ball back on its own tube just puts it
+                            # down: no move is counted and nothing is recorded.
+                            # (The original game ran it through the normal drop
+                            # check, so it counted as a move on a sorted tube
+                            # and ended the game on a mixed one.)
+                            if target_compartment is not source_compartment:
+                                play_move(source_compartment.index, target_compartment.index)
                         selected_ball = None
                         following = False
-            elif time_up or game_over:
-                mouse_pos = pygame.mouse.get_pos()
-                if end_button.is_clicked(mouse_pos):
-                    running = False
-                elif restart_button.is_clicked(mouse_pos):
-                    current_level = 1
-                    compartments = initialize_level(current_level)
-                    start_time = time.time()
-                    move_limit = LEVELS[current_level - 1]["move_limit"]
-                    move_count = 0
-                    game_won = False
-                    time_up = False
-                    game_over = False
-                    selected_ball = None
-                    following = False
-                    lives = 1
-                elif use_life_button.is_clicked(mouse_pos) and lives > 0:
-                    lives -= 1
-                    compartments = initialize_level(current_level)
-                    start_time = time.time()
-                    move_limit = LEVELS[current_level - 1]["move_limit"]
-                    move_count = 0
-                    game_won = False
-                    time_up = False
-                    game_over = False
-                    selected_ball = None
-                    following = False
-            elif win_popup:
-                mouse_pos = pygame.mouse.get_pos()
-                if next_level_button.is_clicked(mouse_pos) and current_level < len(LEVELS):
-                    current_level += 1
-                    compartments = initialize_level(current_level)
-                    start_time = time.time()
-                    move_limit = LEVELS[current_level - 1]["move_limit"]
-                    move_count = 0
-                    game_won = False
-                    win_popup = False
-                    selected_ball = None
-                    following = False
-                elif exit_button.is_clicked(mouse_pos):
-                    running = False
-
-    # Game logic
-    if game_started:
-        if not game_won and not time_up and not game_over:
-            all_sorted = True
-            for compartment in compartments:
-                if len(compartment.balls) > 0:
-                    first_color = compartment.balls[0][0]
-                    if not all(ball[0] == first_color for ball in compartment.balls):
-                        all_sorted = False
-                        break
-            if all_sorted and all(len(compartment.balls) == 0 or len(compartment.balls) == LEVELS[current_level - 1]["balls_per_color"] for compartment in compartments):
-                game_won = True
-                win_popup = True
-                win_time = time.time() - start_time
-                lives += 1
-
-        elapsed_time = time.time() - start_time
-        if elapsed_time >= TIME_LIMIT and not game_won and not time_up and not game_over:
-            time_up = True
-
-        if not game_won and not time_up and not game_over and is_stuck(compartments):
-            game_over = True
-
-        if move_limit is not None and move_count >= move_limit and not game_won and not time_up and not game_over:
-            game_over = True
-
-    # Draw
-    if not game_started:
-        WINDOW.fill(LIGHT_BLUE)
-
-        # Update and draw animated balls
-        for ball in animated_balls:
-            ball.update()
-            ball.draw()
-        
-        writeup_lines = []
-        words = WRITEUP_TEXT.split()
-        current_line = ""
-        for word in words:
-            test_line = current_line + " " + word if current_line else word
-            if SMALL_FONT.render(test_line, True, BLACK).get_width() < WIDTH - 40:
-                current_line = test_line
-            else:
-                writeup_lines.append(current_line)
-                current_line = word
-        if current_line:
-            writeup_lines.append(current_line)
-        
-        total_height = (len(writeup_lines) + 1) * 25
-        start_y = HEIGHT // 2 - total_height // 2
-        for i, line in enumerate(writeup_lines):
-            writeup_surface = SMALL_FONT.render(line, True, BLACK)
-            WINDOW.blit(writeup_surface, (WIDTH // 2 - writeup_surface.get_width() // 2, start_y + i * 25))
-        
-        note_surface = SMALL_FONT.render(START_NOTE, True, BLACK)
-        WINDOW.blit(note_surface, (WIDTH // 2 - note_surface.get_width() // 2, start_y + len(writeup_lines) * 25))
-        
-        start_toggle.draw()
-        start_button.draw()
-    else:
-        if BACKGROUND:
-            WINDOW.blit(BACKGROUND, (0, 0))
+                elif time_up or game_over:
+                    mouse_pos = pygame.mouse.get_pos()
+                    if end_button.is_clicked(mouse_pos):
+                        running = False
+                    elif restart_button.is_clicked(mouse_pos):
+                        current_level = 1
+                        lives = 1
+                        start_level(current_level)
+                    elif use_life_button.is_clicked(mouse_pos) and lives > 0:
+                        lives -= 1
+                        start_level(current_level)
+                elif win_popup:
+                    mouse_pos = pygame.mouse.get_pos()
+                    if next_level_button.is_clicked(mouse_pos) and current_level < len(LEVELS):
+                        current_level += 1
+                        start_level(current_level)
+                    elif exit_button.is_clicked(mouse_pos):
+                        running = False
+
+        sim_start = time.perf_counter()
+        PROFILER.record("events", frame_start, sim_start)
+
+        # Advance the animation by whole steps for the time that has passed;
+        # the remainder carries over and is used to interpolate the drawing.
+        # Only this is clamped; the level timer reads the clock directly.
+        accumulator += min(sim_start - last_time, MAX_FRAME_TIME)
+        last_time = sim_start
+        while accumulator >= SIM_DT:
+            accumulator -= SIM_DT
+            if not game_started:
+                if start_particles:
+                    start_particles.step()
+                for ball in animated_balls:
+                    ball.update()
+                idle_ticks += 1
+            if bot_playing:
+                bot_ticks += 1
+        alpha = accumulator / SIM_DT
+
+        logic_start = time.perf_counter()
+        PROFILER.record("simulate", sim_start, logic_start)
+
+        # Game logic
+        if game_started:
+            # A new board object only appears when a move lands or a level is
+            # dealt, so the win and stuck checks run once per change, not per frame
+            board_changed = board is not checked_board
+            checked_board = board
+            if board_changed and not game_won and not time_up and not game_over:
+                if board.is_solved():
+                    game_won = True
+                    win_popup = True
+                    win_time = level_clock()
+                    if not bot_assisted:
+                        lives += 1
+                    finish_level(WIN, win_time)
+                    win_record = win_record_text()
+
+            if not game_won and not time_up and not game_over:
+                elapsed_time = level_clock()
+            if elapsed_time >= TIME_LIMIT and not game_won and not time_up and not game_over:
+                time_up = True
+                finish_level(TIME_UP, elapsed_time)
+
+            if board_changed and not game_won and not time_up and not game_over and board.is_stuck():
+                game_over = True
+                finish_level(STUCK, elapsed_time)
+
+            if move_limit is not None and move_count >= move_limit and not game_won and not time_up and not game_over:
+                game_over = True
+                finish_level(OUT_OF_MOVES, elapsed_time)
+
+            # Start solving the new position straight away, before anyone asks
+            if board_changed and not game_won and not time_up and not game_over and not bot_playing:
+                HINTS.request(board)
+
+            # The bot searches a little every frame and moves at a watchable pace
+            if bot_playing and not game_won and not time_up and not game_over:
+                BOT.update(board, None if move_limit is None else move_limit - move_count)
+                with PROFILER.section("bot"):
+                    BOT.think(BOT_BUDGET)
+                if bot_ticks >= BOT_MOVE_TICKS and not following:
+                    bot_ticks = 0
+                    move = BOT.move()
+                    if move:
+                        bot_assisted = True
+                        play_move(*move)
+            elif attract and bot_ticks >= ATTRACT_PAUSE_TICKS:
+                start_demo()
+        elif idle_ticks * SIM_DT >= ATTRACT_DELAY:
+            start_demo()
+
+        draw_start = time.perf_counter()
+        PROFILER.record("logic", logic_start, draw_start)
+
+        # Draw
+        dirty_rects = None
+        if not game_started:
+            draw_start_screen(alpha)
         else:
-            WINDOW.fill(WHITE)
+            # Popups are drawn straight onto the window, so those screens repaint fully
+            full_repaint = not DIRTY_RECTS or game_won or time_up or game_over
+            hud_start = time.perf_counter()
+            overlays = []
+            if bot_playing and not game_won and not time_up and not game_over:
+                bot_note = "Demo: press any key to play" if attract else "Bot playing: B to take over"
+                overlays.append(("text", TEXT.render(SMALL_FONT, bot_note, BLACK), (10, 45)))
+            elif hint_board is board and not game_won and not time_up and not game_over:
+                overlays += hint_overlays()
+            if following and selected_ball:
+                overlays.append(("ball", palette[selected_ball[1]], pygame.mouse.get_pos()))
 
-        if LOGO:
-            WINDOW.blit(LOGO, (WIDTH // 2 - LOGO.get_width() // 2, 10))
-        
-        for compartment in compartments:
-            compartment.draw()
-
-        if following and selected_ball:
-            mouse_x, mouse_y = pygame.mouse.get_pos()
-            color = selected_ball[2]
-            if BALL_IMAGES[color] is not None:
-                WINDOW.blit(BALL_IMAGES[color], (mouse_x - BALL_RADIUS, mouse_y - BALL_RADIUS))
-            else:
-                pygame.draw.circle(WINDOW, color, (mouse_x, mouse_y), BALL_RADIUS)
-
-        if not game_won and not time_up and not game_over:
-            remaining_time = max(0, TIME_LIMIT - elapsed_time)
-            timer_color = RED if remaining_time < 30 else BLACK
-            if move_limit is not None:
-                moves_remaining = max(0, move_limit - move_count)
-                timer_text = FONT.render(f"Level {current_level} | Time: {remaining_time:.2f}s | Moves: {moves_remaining}", True, timer_color)
-            else:
-                timer_text = FONT.render(f"Level {current_level} | Time: {remaining_time:.2f}s", True, timer_color)
-            WINDOW.blit(timer_text, (10, 10))
-
-            lives_text = FONT.render(f"{HEART_EMOJI} x {lives}", True, RED)
-            WINDOW.blit(lives_text, (WIDTH - lives_text.get_width() - 10, 10))
-
-        elif time_up or game_over:
-            if time_up:
-                timer_text = FONT.render("Time's Up!", True, RED)
-            else:
-                timer_text = FONT.render("Game Over!", True, RED)
-            WINDOW.blit(timer_text, (10, 10))
+            if not game_won and not time_up and not game_over:
+                remaining_time = max(0, TIME_LIMIT - elapsed_time)
+                timer_color = RED if remaining_time < 30 else BLACK
+                hud_segments = [(f"Level {current_level} | Time: ", False), (f"{remaining_time:.2f}", True), ("s", False)]
+                if move_limit is not None:
+                    moves_remaining = max(0, move_limit - move_count)
+                    hud_segments += [(" | Moves: ", False), (str(moves_remaining), True)]
+                overlays += hud_overlays(hud_segments, timer_color, (10, 10))
+
+                lives_text = TEXT.render(FONT, f"{HEART_EMOJI} x {lives}", RED)
+                overlays.append(("text", lives_text, (WIDTH - lives_text.get_width() - 10, 10)))
+
+            if SHOW_PROFILER and not full_repaint:
+                overlays += profiler_overlays()
+            PROFILER.record("draw.hud", hud_start, time.perf_counter())
+
+            if full_repaint:
+                renderer.invalidate()
+            dirty_rects = renderer.draw(board, palette, overlays)
+            if full_repaint:
+                renderer.invalidate()
+                dirty_rects = None
+
+            if time_up or game_over:
+                if time_up:
+                    timer_text = TEXT.render(FONT, "Time's Up!", RED)
+                else:
+                    timer_text = TEXT.render(FONT, "Game Over!", RED)
+                WINDOW.blit(timer_text, (10, 10))
             
-            lives_text = FONT.render(f"{HEART_EMOJI} Left: {lives}", True, RED)
-            WINDOW.blit(lives_text, (WIDTH - lives_text.get_width() - 10, 10))
+                lives_text = TEXT.render(FONT, f"{HEART_EMOJI} Left: {lives}", RED)
+                WINDOW.blit(lives_text, (WIDTH - lives_text.get_width() - 10, 10))
             
-            notification_rect = pygame.Rect(WIDTH // 2 - 200, HEIGHT // 2 - 150, 400, 300)
-            pygame.draw.rect(WINDOW, WHITE, notification_rect)
-            pygame.draw.rect(WINDOW, BLACK, notification_rect, 3)
-            if time_up:
-                game_over_message = NOTIFICATION_FONT.render("Time's Up!", True, RED)
-                tip_message1 = SMALL_FONT.render("Try to plan moves ahead", True, BLACK)
-                tip_message2 = SMALL_FONT.render("and sort faster next time!", True, BLACK)
-            elif move_limit is not None and move_count >= move_limit:
-                game_over_message = NOTIFICATION_FONT.render("Out of Moves!", True, RED)
-                tip_message1 = SMALL_FONT.render("Try to use fewer moves", True, BLACK)
-                tip_message2 = SMALL_FONT.render("by planning better!", True, BLACK)
-            else:
-                game_over_message = NOTIFICATION_FONT.render("Game Over!", True, RED)
-                tip_message1 = SMALL_FONT.render("Look for empty spaces", True, BLACK)
-                tip_message2 = SMALL_FONT.render("to avoid getting stuck!", True, BLACK)
-            WINDOW.blit(game_over_message, (WIDTH // 2 - game_over_message.get_width() // 2, HEIGHT // 2 - 100))
-            WINDOW.blit(tip_message1, (WIDTH // 2 - tip_message1.get_width() // 2, HEIGHT // 2 - 40))
-            WINDOW.blit(tip_message2, (WIDTH // 2 - tip_message2.get_width() // 2, HEIGHT // 2 - 20))
-            end_button.draw()
-            restart_button.draw()
-            if lives > 0:
-                use_life_button.draw()
-
-        if win_popup:
-            lives_text = FONT.render(f"{HEART_EMOJI} x {lives}", True, RED)
-            WINDOW.blit(lives_text, (WIDTH - lives_text.get_width() - 10, 10))
+                notification_rect = pygame.Rect(WIDTH // 2 - 200, HEIGHT // 2 - 150, 400, 300)
+                pygame.draw.rect(WINDOW, WHITE, notification_rect)
+                pygame.draw.rect(WINDOW, BLACK, notification_rect, 3)
+                if time_up:
+                    game_over_message = TEXT.render(NOTIFICATION_FONT, "Time's Up!", RED)
+                    tip_message1 = TEXT.render(SMALL_FONT, "Try to plan moves ahead", BLACK)
+                    tip_message2 = TEXT.render(SMALL_FONT, "and sort faster next time!", BLACK)
+                elif move_limit is not None and move_count >= move_limit:
+                    game_over_message = TEXT.render(NOTIFICATION_FONT, "Out of Moves!", RED)
+                    tip_message1 = TEXT.render(SMALL_FONT, "Try to use fewer moves", BLACK)
+                    tip_message2 = TEXT.render(SMALL_FONT, "by planning better!", BLACK)
+                else:
+                    game_over_message = TEXT.render(NOTIFICATION_FONT, "Game Over!", RED)
+                    tip_message1 = TEXT.render(SMALL_FONT, "Look for empty spaces", BLACK)
+                    tip_message2 = TEXT.render(SMALL_FONT, "to avoid getting stuck!", BLACK)
+                WINDOW.blit(game_over_message, (WIDTH // 2 - game_over_message.get_width() // 2, HEIGHT // 2 - 100))
+                WINDOW.blit(tip_message1, (WIDTH // 2 - tip_message1.get_width() // 2, HEIGHT // 2 - 40))
+                WINDOW.blit(tip_message2, (WIDTH // 2 - tip_message2.get_width() // 2, HEIGHT // 2 - 20))
+                end_button.draw()
+                restart_button.draw()
+                if lives > 0:
+                    use_life_button.draw()
+
+            if win_popup:
+                lives_text = TEXT.render(FONT, f"{HEART_EMOJI} x {lives}", RED)
+                WINDOW.blit(lives_text, (WIDTH - lives_text.get_width() - 10, 10))
             
-            notification_rect = pygame.Rect(WIDTH // 2 - 150, HEIGHT // 2 - 100, 300, 200)
-            pygame.draw.rect(WINDOW, WHITE, notification_rect)
-            pygame.draw.rect(WINDOW, BLACK, notification_rect, 3)
-            win_message = NOTIFICATION_FONT.render("You Win!", True, BLACK)
-            time_message = FONT.render(f"Time: {win_time:.2f}s", True, BLACK)
-            WINDOW.blit(win_message, (WIDTH // 2 - win_message.get_width() // 2, HEIGHT // 2 - 80))
-            WINDOW.blit(time_message, (WIDTH // 2 - time_message.get_width() // 2, HEIGHT // 2 - 30))
-            if current_level < len(LEVELS):
-                next_level_button.draw()
-            exit_button.draw()
-
-    pygame.display.flip()
-    clock.tick(60)
-
-pygame.quit()
-sys.exit()
\ No newline at end of file
+                notification_rect = pygame.Rect(WIDTH // 2 - 150, HEIGHT // 2 - 100, 300, 200)
+                pygame.draw.rect(WINDOW, WHITE, notification_rect)
+                pygame.draw.rect(WINDOW, BLACK, notification_rect, 3)
+                win_message = TEXT.render(NOTIFICATION_FONT, "You Win!", BLACK)
+                time_message = TEXT.render(FONT, f"Time: {win_time:.2f}s", BLACK)
+                WINDOW.blit(win_message, (WIDTH // 2 - win_message.get_width() // 2, HEIGHT // 2 - 80))
+                WINDOW.blit(time_message, (WIDTH // 2 - time_message.get_width() // 2, HEIGHT // 2 - 30))
+                if win_record:
+                    record_message = TEXT.render(SMALL_FONT, win_record, BLACK)
+                    WINDOW.blit(record_message, (WIDTH // 2 - record_message.get_width() // 2, HEIGHT // 2 + 15))
+                if current_level < len(LEVELS):
+                    next_level_button.draw()
+                exit_button.draw()
+
+        if SHOW_PROFILER and dirty_rects is None:
+            for _, surface, pos in profiler_overlays():
+                WINDOW.blit(surface, pos)
+        present_start = time.perf_counter()
+        PROFILER.record("draw", draw_start, present_start)
+
+        if dirty_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty_rects)
+        tick_start = time.perf_counter()
+        PROFILER.record("present", present_start, tick_start)
+        PROFILER.record("frame", frame_start, tick_start)
+        # Only the start screen and a dragged ball animate; everything else idles
+        clock.tick(frame_cap(not game_started or following))
+        PROFILER.next_frame()
+
+    wait_for_gameplay()
+    HINTS.close()
+    if RECORDER:
+        RECORDER.close()
+    if STORE:
+        STORE.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
\ No newline at end of file
@@ -0,0 +1,104 @@
+# Vectorized batch simulation: thousands of boards held in NumPy arrays of
+# shape (boards, tubes, capacity) and advanced together with random legal
+# moves. Used to measure playout throughput when tuning level difficulty.
+import random
+
+import numpy as np
+
+from engine import EMPTY_SLOT, Board, deal
+
+# Balls are color indices in uint8, as in the engine's bytes tubes, so any
+# level make_level() accepts fits
+EMPTY = EMPTY_SLOT
+
+
+class BatchBoards:
+    def __init__(self, boards):
+        num_tubes = len(boards[0].tubes)
+        capacity = boards[0].capacity
+        self.per_color = boards[0].per_color
+        self.balls = np.full((len(boards), num_tubes, capacity), EMPTY, dtype=np.uint8)
+        self.heights = np.zeros((len(boards), num_tubes), dtype=np.int8)
+        for b, board in enumerate(boards):
+            for t, tube in enumerate(board.tubes):
+                self.balls[b, t, :len(tube)] = list(tube)
+                self.heights[b, t] = len(tube)
+        self.moves = np.zeros(len(boards), dtype=np.int32)
+
+    @classmethod
+    def dealt(cls, level_data, count, rng=None):
+        return cls([deal(level_data, rng) for _ in range(count)])
+
+    def board(self, b):
+        tubes = [bytes(self.balls[b, t, :self.heights[b, t]]) for t in range(self.balls.shape[1])]
+        return Board(tubes, self.per_color, self.balls.shape[2])
+
+    def _tube_state(self):
+        capacity = self.balls.shape[2]
+        filled = np.arange(capacity) < self.heights[:, :, None]
+        bottom = self.balls[:, :, 0]
+        monochrome = np.all((self.balls == bottom[:, :, None]) | ~filled, axis=2)
+        top_index = np.maximum(self.heights - 1, 0).astype(np.intp)
+        top = np.take_along_axis(self.balls, top_index[:, :, None], axis=2)[:, :, 0]
+        return bottom, monochrome, top
+
+    # legal[b, i, j]: moving the top ball of tube i onto tube j is allowed
+    def legal_moves(self):
+        bottom, monochrome, top = self._tube_state()
+        empty = self.heights == 0
+        open_tube = monochrome & ~empty & (self.heights < self.balls.shape[2])
+        accepts = empty[:, None, :] | (open_tube[:, None, :] & (bottom[:, None, :] == top[:, :, None]))
+        legal = accepts & ~empty[:, :, None]
+        num_tubes = self.balls.shape[1]
+        legal &= ~np.eye(num_tubes, dtype=bool)[None, :, :]
+        return legal
+
+    def solved(self):
+        _, monochrome, _ = self._tube_state()
+        return np.all((self.heights == 0) | (monochrome & (self.heights == self.per_color)), axis=1)
+
+    # Apply one uniformly random legal move on every board that still has one.
+    # Returns the mask of boards that moved.
+    def step(self, rng):
+        legal = self.legal_moves()
+        num_boards, num_tubes, _ = legal.shape
+        flat = legal.reshape(num_boards, -1)
+        scores = np.where(flat, rng.random(flat.shape), -1.0)
+        choice = scores.argmax(axis=1)
+        active = flat[np.arange(num_boards), choice] & ~self.solved()
+        boards = np.nonzero(active)[0]
+        src = choice[boards] // num_tubes
+        dst = choice[boards] % num_tubes
+        src_height = self.heights[boards, src] - 1
+        ball = self.balls[boards, src, src_height]
+        self.balls[boards, src, src_height] = EMPTY
+        self.heights[boards, src] -= 1
+        self.balls[boards, dst, self.heights[boards, dst]] = ball
+        self.heights[boards, dst] += 1
+        self.moves[boards] += 1
+        return active
+
+    # Play random legal moves until every board is solved or stuck, or
+    # max_steps is reached. Returns the number of moves applied.
+    def playout(self, max_steps=200, seed=None):
+        rng = np.random.default_rng(seed)
+        total = 0
+        for _ in range(max_steps):
+            moved = int(self.step(rng).sum())
+            if moved == 0:
+                break
+            total += moved
+        return total
+
+
+def random_playouts(level_data, count=4096, max_steps=200, seed=None):
+    # Summary of random playouts: how often they win, how long they run
+    batch = BatchBoards.dealt(level_data, count, random.Random(seed))
+    total = batch.playout(max_steps, seed)
+    solved = batch.solved()
+    return {
+        "boards": count,
+        "moves": total,
+        "solved_rate": float(solved.mean()),
+        "mean_moves_to_solve": float(batch.moves[solved].mean()) if solved.any() else None,
+    }
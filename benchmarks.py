@@ -0,0 +1,288 @@
+# Benchmark suite for the performance-critical pieces of the game.
+# Each benchmark is timed over many samples and reported as ops/sec plus
+# p50/p95/p99 latency per call. Results are written as JSON and can be
+# checked against a saved baseline; a slowdown beyond the tolerance fails:
+#   python benchmarks.py --save            # record bench_baseline.json
+#   python benchmarks.py                   # compare against it
+# Frames are drawn offscreen through SDL's dummy video driver.
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from engine import deal
+from levels import LEVELS, make_level
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+# Time fn in samples of batch calls each. setup() builds the argument for one
+# sample so its cost stays out of the measurement.
+def measure(fn, setup=None, samples=50, batch=20):
+    timings = []
+    for _ in range(samples):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn(arg)
+        timings.append((time.perf_counter() - start) / batch)
+    timings.sort()
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(p / 100 * len(timings)))] * 1e6
+
+    return {
+        "ops_per_sec": len(timings) / sum(timings),
+        "p50_us": percentile(50),
+        "p95_us": percentile(95),
+        "p99_us": percentile(99),
+    }
+
+
+def engine_benchmarks(rng):
+    results = {}
+    boards = [deal(LEVELS[-1], rng) for _ in range(256)]
+    played = []
+    for board in boards:
+        moves = board.legal_moves()
+        played.append((board, moves[0] if moves else None))
+    playable = [(board, move) for board, move in played if move]
+    pick = lambda: rng.choice(boards)
+    results["engine.is_stuck"] = measure(lambda board: board.is_stuck(), pick)
+    results["engine.is_solved"] = measure(lambda board: board.is_solved(), pick)
+    results["engine.legal_moves"] = measure(lambda board: board.legal_moves(), pick)
+    results["engine.apply_move"] = measure(lambda item: item[0].apply_move(*item[1]), lambda: rng.choice(playable))
+    return results
+
+
+def game_benchmarks(rng):
+    import ball_sorting_game as game
+
+    game.init_display()
+    game.load_ball_images()
+    game.load_play_assets()
+    results = {}
+    for level in range(1, len(LEVELS) + 1):
+        results[f"game.initialize_level.{level}"] = measure(lambda _: game.initialize_level(level), samples=20, batch=5)
+
+    compartments, board, _, _, _ = game.initialize_level(len(LEVELS))
+    palette = LEVELS[-1]["colors"]
+
+    def full_frame(_):
+        for compartment in compartments:
+            compartment.draw(board, palette)
+
+    results["game.compartment_draw_frame"] = measure(full_frame, samples=30, batch=10)
+
+    # Full repaints through the virtualized renderer should cost about the
+    # same however many tubes are off screen
+    for tubes in (12, 300):
+        level_data = make_level(tubes // 2, 4, tubes, capacity=6)
+        compartments, board, _, layout, _ = game.initialize_level(0, level_data=level_data)
+        renderer = game.BoardRenderer(compartments, layout)
+        renderer.scroll_by(layout.bottom() // 2)
+
+        def repaint(_):
+            renderer.invalidate()
+            renderer.draw(board, level_data["colors"], [])
+
+        results[f"game.board_repaint_{tubes}_tubes"] = measure(repaint, samples=30, batch=10)
+    return results
+
+
+# Fresh interpreters, timed from launch: importing the game module, getting
+# the first start screen frame on screen, and having the play screen loaded
+# too (without the stats store and replay log, which would write files)
+STARTUP_STAGES = {
+    "import": "import ball_sorting_game as game",
+    "first_frame": "import ball_sorting_game as game\n"
+                   "game.init_display()\n"
+                   "game.load_start_screen()\n"
+                   "game.draw_start_screen(0.0)\n"
+                   "game.pygame.display.flip()",
+    "gameplay_ready": "import ball_sorting_game as game\n"
+                      "game.PERSIST_STATS = game.RECORD_REPLAYS = False\n"
+                      "game.init_display()\n"
+                      "game.load_start_screen()\n"
+                      "game.start_loading()\n"
+                      "game.draw_start_screen(0.0)\n"
+                      "game.pygame.display.flip()\n"
+                      "game.wait_for_gameplay()",
+}
+
+
+def startup_benchmarks(rng):
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for stage, script in STARTUP_STAGES.items():
+        run = lambda _: subprocess.run([sys.executable, "-c", script], cwd=here, check=True,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        results[f"startup.{stage}"] = measure(run, samples=7, batch=1)
+    return results
+
+
+def particle_benchmarks(rng):
+    try:
+        from particles import ParticleSystem
+    except ImportError:
+        return {}
+    import pygame
+
+    pygame.display.init()
+    surface = pygame.Surface((600, 600))
+    colors = [(255, 0, 0), (0, 0, 255), (255, 255, 0), (0, 255, 0)]
+    results = {}
+    for count in (10, 2000):
+        system = ParticleSystem(count, 600, 600, 4 if count > 100 else 15, colors, seed=rng.getrandbits(32))
+
+        def frame(_):
+            system.step()
+            system.draw(surface, 0.5)
+
+        results[f"particles.frame_{count}"] = measure(frame, samples=20, batch=10)
+    return results
+
+
+def store_benchmarks(rng):
+    import tempfile
+    from stats_store import StatsStore
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = StatsStore(os.path.join(tmp, "bench.db"))
+
+        def rows():
+            return [(f"player{rng.randrange(20000)}", rng.randint(1, len(LEVELS)), rng.getrandbits(32),
+                     rng.choice((1, 1, 2, 3, 5)), rng.randint(5000, 180000), rng.randint(3, 70), 0.0)
+                    for _ in range(10000)]
+
+        result = measure(store.bulk_insert, rows, samples=20, batch=1)
+        # One op is a batch of 10,000 results
+        result["rows_per_sec"] = result["ops_per_sec"] * 10000
+        results["store.bulk_insert_10k"] = result
+
+        results["store.record_result"] = measure(lambda _: store.record_result("bench", 3, 1, 1, 30000, 12))
+        store.flush()
+        results["store.leaderboard_top10"] = measure(lambda _: store.leaderboard(3))
+        results["store.rank"] = measure(lambda _: store.rank("bench", 3))
+        store.close()
+    return results
+
+
+def bot_benchmarks(rng):
+    from bot import BotPlayer
+    from level_generator import scramble
+
+    results = {}
+    bot = BotPlayer()
+    # Scrambled back from solved, so they are winnable and keep the search busy
+    level_data = LEVELS[-1]
+    boards = [scramble(level_data, rng, 4 * len(level_data["colors"]) * level_data["balls_per_color"])
+              for _ in range(16)]
+    # One op is a 2 ms slice; a slice that overruns its budget shows up as
+    # fewer than 500 ops/s and a p99 past 2000us
+    results["bot.think_slice_2ms"] = measure(lambda _: bot.think(0.002), lambda: bot.reset(rng.choice(boards)),
+                                             samples=50, batch=5)
+
+    def first_plan(board):
+        bot.reset(board, LEVELS[3]["move_limit"])
+        while bot.plan is None and not bot.think(0.002):
+            pass
+
+    # Time for the bot to find its first solution to a level 4 deal
+    boards = [deal(LEVELS[3], rng) for _ in range(16)]
+    results["bot.first_plan_level4"] = measure(first_plan, lambda: rng.choice(boards), samples=20, batch=1)
+    return results
+
+
+def batch_benchmarks(rng):
+    try:
+        from batch_sim import BatchBoards
+    except ImportError:
+        return {}
+    import numpy as np
+
+    level_data = LEVELS[-1]
+    boards = [deal(level_data, rng) for _ in range(4096)]
+    np_rng = np.random.default_rng(0)
+    batch = {}
+
+    def fresh():
+        batch["boards"] = BatchBoards(boards)
+
+    result = measure(lambda _: batch["boards"].step(np_rng), fresh, samples=10, batch=5)
+    # One op is a step over every board, so scale to board-moves per second
+    result["board_steps_per_sec"] = result["ops_per_sec"] * len(boards)
+    return {"batch.random_playout_step_4096": result}
+
+
+def run(include_game=True):
+    rng = random.Random(1234)
+    results = engine_benchmarks(rng)
+    if include_game:
+        results.update(startup_benchmarks(rng))
+        results.update(game_benchmarks(rng))
+        results.update(particle_benchmarks(rng))
+    results.update(store_benchmarks(rng))
+    results.update(bot_benchmarks(rng))
+    results.update(batch_benchmarks(rng))
+    return results
+
+
+# Benchmarks whose ops/sec fell more than tolerance below the baseline
+def regressions(results, baseline, tolerance):
+    failed = []
+    for name, base in sorted(baseline.items()):
+        if name not in results:
+            continue
+        current = results[name]["ops_per_sec"]
+        change = current / base["ops_per_sec"] - 1
+        if change < -tolerance:
+            failed.append((name, base["ops_per_sec"], current, change))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ball sorting game benchmarks.")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    parser.add_argument("--engine-only", action="store_true", help="skip benchmarks that need pygame")
+    args = parser.parse_args()
+
+    results = run(include_game=not args.engine_only)
+    for name, result in results.items():
+        print(f"{name:40s} {result['ops_per_sec']:>14,.0f} ops/s  p50 {result['p50_us']:9.1f}us  "
+              f"p95 {result['p95_us']:9.1f}us  p99 {result['p99_us']:9.1f}us")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failed = regressions(results, baseline, args.tolerance)
+    if failed:
+        print(f"\nRegressions beyond {args.tolerance:.0%}:")
+        for name, before, after, change in failed:
+            print(f"  {name:40s} {before:>14,.0f} -> {after:>14,.0f} ops/s ({change:+.1%})")
+        return 1
+    print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
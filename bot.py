@@ -0,0 +1,195 @@
+# Anytime bot player for demos, attract mode and unattended play.
+# A beam search over engine boards that is advanced a slice at a time:
+# think(budget) expands positions until budget seconds have gone and then
+# returns. No single step grows with the search (see SEEN_CHUNK), so a slice
+# overshoots its budget by at most one step, well under a millisecond even
+# with 30+ tubes. That bound doesn't cover a cyclic garbage collection that
+# happens to run during the slice, so leave the frame some slack beyond it.
+# Each pass keeps the `width` most promising positions at every depth, ranked
+# by the solver's heuristic. When a pass finishes the width doubles and the
+# search starts over, looking only for solutions shorter than the best one
+# so far, until a pass either fits in its width (so nothing was cut and the
+# answer is exact) or reaches max_width. move() always has an answer ready:
+# the best solution found so far, or else the first step towards the most
+# promising position seen.
+import heapq
+import time
+
+from solver import canonical_key, heuristic, successors
+
+# Keys per transposition set. A set that grows resizes its whole table in
+# one go (about 4 ms at 80,000 keys, 16 ms at 300,000), so a pass fills a
+# list of small sets instead of one big one.
+SEEN_CHUNK = 1 << 14
+
+
+# Moves from the root to a search node, kept as (parent, move) links so a
+# child costs one tuple instead of a copy of the whole path
+def _moves(path):
+    moves = []
+    while path is not None:
+        path, move = path
+        moves.append(move)
+    moves.reverse()
+    return moves
+
+
+# Whether key is in any of a pass's transposition sets
+def _seen(chunks, key):
+    for chunk in chunks:
+        if key in chunk:
+            return True
+    return False
+
+
+class BotPlayer:
+    def __init__(self, width=8, max_width=1024, clock=time.perf_counter):
+        self.width = width
+        self.max_width = max_width
+        self.clock = clock
+        self.root = None
+        self.moves_left = None
+        self.plan = None      # shortest solution found from root
+        self.lead = None      # (heuristic, moves) towards the best position seen
+        self.done = True
+        self.search = None
+        self.seen = [set()]   # canonical keys reached in the current pass
+        self.garbage = []     # earlier passes' sets, still being freed
+
+    # Start over on a new board. moves_left caps the plan length (None for
+    # no move limit).
+    def reset(self, board, moves_left=None):
+        self.root = board
+        self.moves_left = moves_left
+        self.plan = None
+        self.lead = None
+        self._restart()
+
+    # Follow the game to its current board. After one of our own moves the
+    # plan carries over, minus the move just played; anything else (the
+    # player moved, undo, a new level) starts a fresh search.
+    def update(self, board, moves_left=None):
+        if board is self.root:
+            return
+        if self.root is not None:
+            plan = self._advanced(self.plan, board)
+            lead = self._advanced(self.lead[1] if self.lead else None, board)
+            if plan is not None or lead is not None:
+                self.root = board
+                self.moves_left = moves_left
+                self.plan = plan
+                self.lead = (self.lead[0], lead) if lead else None
+                self._restart()
+                return
+        self.reset(board, moves_left)
+
+    # What is left of moves once its first move has taken root to board, or
+    # None if it doesn't
+    def _advanced(self, moves, board):
+        if moves and self.root.apply_move(*moves[0]) == board:
+            return moves[1:]
+        return None
+
+    def _restart(self):
+        self._discard()
+        self.done = self.root is None or self.root.is_solved()
+        self.search = None if self.done else self._passes()
+
+    # Set aside the current pass's transposition sets. Freeing a few hundred
+    # thousand keys in one go takes milliseconds, so think() empties them a
+    # slice at a time instead.
+    def _discard(self):
+        self.garbage.extend(seen for seen in self.seen if seen)
+        self.seen = [set()]
+
+    # Search for up to budget seconds. Returns True once the plan is final.
+    def think(self, budget):
+        deadline = self.clock() + budget
+        while self.garbage and self.clock() < deadline:
+            seen = self.garbage[-1]
+            for _ in range(min(len(seen), 1000)):
+                seen.pop()
+            if not seen:
+                self.garbage.pop()
+        if self.done:
+            return True
+        try:
+            while self.clock() < deadline:
+                next(self.search)
+        except StopIteration:
+            self.done = True
+        return self.done
+
+    # Next move to play as (src, dst), or None if the board has no legal move
+    def move(self):
+        if self.plan:
+            return self.plan[0]
+        if self.lead and self.lead[1]:
+            return self.lead[1][0]
+        # Nothing searched yet: the child with the best heuristic
+        best = None
+        for src, dst in successors(self.root.tubes, self.root.capacity):
+            child = self.root.apply_move(src, dst)
+            score = (child.is_stuck() and not child.is_solved(), heuristic(child.tubes))
+            if best is None or score < best[0]:
+                best = (score, (src, dst))
+        return best[1] if best else None
+
+    def _passes(self):
+        width = self.width
+        while True:
+            exact = yield from self._beam(width)
+            if exact or width >= self.max_width:
+                return
+            width = min(self.max_width, width * 2)
+
+    # One beam pass; yields before every position it generates. Returns True
+    # if nothing was cut from the beam, so the pass was a complete search.
+    def _beam(self, width):
+        root = self.root
+        limit = self.moves_left
+        if self.plan is not None:
+            limit = len(self.plan) - 1 if limit is None else min(limit, len(self.plan) - 1)
+        self._discard()
+        seen = self.seen
+        newest = seen[-1]
+        newest.add(canonical_key(root.tubes))
+        beam = [(root, None)]
+        exact = True
+        count = 0
+        depth = 0
+        while beam and (limit is None or depth < limit):
+            # Max-heap on heuristic of the best `width` children, so the worst
+            # is dropped as soon as a better one turns up
+            children = []
+            for board, path in beam:
+                for move in successors(board.tubes, board.capacity):
+                    yield
+                    child = board.apply_move(*move)
+                    key = canonical_key(child.tubes)
+                    if _seen(seen, key):
+                        continue
+                    if len(newest) >= SEEN_CHUNK:
+                        newest = set()
+                        seen.append(newest)
+                    newest.add(key)
+                    child_path = (path, move)
+                    if child.is_solved():
+                        # Depth by depth, so this is the shortest this pass finds
+                        self.plan = _moves(child_path)
+                        return exact
+                    if child.is_stuck():
+                        continue
+                    score = heuristic(child.tubes)
+                    if self.lead is None or score < self.lead[0]:
+                        self.lead = (score, _moves(child_path))
+                    count += 1
+                    item = (-score, -count, child, child_path)
+                    if len(children) < width:
+                        heapq.heappush(children, item)
+                    else:
+                        heapq.heappushpop(children, item)
+                        exact = False
+            beam = [(child, path) for _, _, child, path in children]
+            depth += 1
+        return exact
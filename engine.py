@@ -0,0 +1,151 @@
+# Headless puzzle engine for the ball sorting game.
+# A board is a tuple of bytes objects, one per tube, holding color indices
+# (positions in the level's "colors" list) from bottom to top. Boards are
+# immutable and hashable, and nothing here touches pygame, so solvers,
+# generators and batch simulations can import it freely.
+import random
+
+CAPACITY = 5  # Tube capacity for levels that don't set their own
+EMPTY_SLOT = 0xFF
+
+
+def level_capacity(level_data):
+    return level_data.get("capacity", CAPACITY)
+
+
+# Per-tube summary kept alongside the balls: top color, length of the run of
+# that color at the top, whether the whole tube is one color, and whether it
+# is finished (one color, per_color balls). Empty tubes summarize to None.
+def summarize(tube, per_color):
+    if not tube:
+        return None
+    top = tube[-1]
+    run = len(tube) - len(tube.rstrip(bytes((top,))))
+    monochrome = run == len(tube)
+    return (top, run, monochrome, monochrome and len(tube) == per_color)
+
+
+class Board:
+    __slots__ = ("tubes", "per_color", "capacity", "summaries", "unfinished", "empty")
+
+    def __init__(self, tubes, per_color, capacity=CAPACITY):
+        self.tubes = tuple(bytes(tube) for tube in tubes)
+        self.per_color = per_color
+        self.capacity = capacity
+        self.summaries = tuple(summarize(tube, per_color) for tube in self.tubes)
+        self.unfinished = sum(1 for summary in self.summaries if summary is not None and not summary[3])
+        self.empty = self.summaries.count(None)
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.tubes == other.tubes and self.per_color == other.per_color
+
+    def __hash__(self):
+        return hash(self.tubes)
+
+    def __repr__(self):
+        return f"Board({[list(tube) for tube in self.tubes]}, per_color={self.per_color})"
+
+    def can_add(self, index, color):
+        summary = self.summaries[index]
+        return summary is None or (summary[2] and summary[0] == color and len(self.tubes[index]) < self.capacity)
+
+    def is_legal(self, src, dst):
+        return src != dst and self.summaries[src] is not None and self.can_add(dst, self.summaries[src][0])
+
+    def legal_moves(self):
+        targets = []
+        for j, summary in enumerate(self.summaries):
+            if summary is None:
+                targets.append((j, -1))
+            elif summary[2] and len(self.tubes[j]) < self.capacity:
+                targets.append((j, summary[0]))
+        moves = []
+        for i, summary in enumerate(self.summaries):
+            if summary is None:
+                continue
+            top = summary[0]
+            for j, color in targets:
+                if j != i and (color == -1 or color == top):
+                    moves.append((i, j))
+        return moves
+
+    # Only the two touched tubes change, and their new summaries follow from
+    # the old ones: the target tube was one color, so it still is with one
+    # more ball, and the source only needs a rescan when its top run is used
+    # up. The won and stuck answers come from the summaries and counters.
+    def apply_move(self, src, dst):
+        summaries = self.summaries
+        moving = summaries[src]
+        target = summaries[dst]
+        if (src == dst or moving is None
+                or not (target is None or (target[2] and target[0] == moving[0]
+                                           and len(self.tubes[dst]) < self.capacity))):
+            raise ValueError(f"illegal move {src} -> {dst}")
+        per_color = self.per_color
+        color, run, monochrome, finished = moving
+        tubes = list(self.tubes)
+        source = tubes[src]
+        tubes[dst] += source[-1:]
+        source = tubes[src] = source[:-1]
+        if run > 1:
+            after_src = (color, run - 1, monochrome, False)
+        else:
+            after_src = summarize(source, per_color)
+        height = 1 if target is None else target[1] + 1
+        after_dst = (color, height, True, height == per_color)
+        summaries = list(summaries)
+        summaries[src] = after_src
+        summaries[dst] = after_dst
+        board = Board.__new__(Board)
+        board.tubes = tuple(tubes)
+        board.per_color = per_color
+        board.capacity = self.capacity
+        board.summaries = tuple(summaries)
+        board.unfinished = (self.unfinished + (after_src is not None and not after_src[3]) - (not finished)
+                            + (height != per_color) - (target is not None and not target[3]))
+        board.empty = self.empty + (after_src is None) - (target is None)
+        return board
+
+    def is_solved(self):
+        return self.unfinished == 0
+
+    # A move exists if there is an empty tube, or an unfilled one-color tube
+    # whose color also sits on top of some other tube.
+    def is_stuck(self):
+        if self.empty:
+            return False
+        tops = {}
+        for summary in self.summaries:
+            tops[summary[0]] = tops.get(summary[0], 0) + 1
+        for index, summary in enumerate(self.summaries):
+            if summary[2] and len(self.tubes[index]) < self.capacity and tops[summary[0]] > 1:
+                return False
+        return True
+
+    def pack(self):
+        # Fixed-width encoding: capacity bytes per tube, padded with EMPTY_SLOT
+        return b"".join(tube + bytes((EMPTY_SLOT,)) * (self.capacity - len(tube)) for tube in self.tubes)
+
+    @classmethod
+    def unpack(cls, data, per_color, capacity=CAPACITY):
+        tubes = []
+        for start in range(0, len(data), capacity):
+            tubes.append(bytes(data[start:start + capacity]).rstrip(bytes((EMPTY_SLOT,))))
+        return cls(tubes, per_color, capacity)
+
+
+# Deal a level the same way the game always has: shuffle every ball and hand
+# them out round-robin, leaving at least one compartment empty.
+def deal(level_data, rng=None):
+    rng = rng if rng is not None else random
+    balls = []
+    for color in range(len(level_data["colors"])):
+        balls.extend([color] * level_data["balls_per_color"])
+    rng.shuffle(balls)
+    num_compartments = level_data["compartments"]
+    capacity = level_capacity(level_data)
+    num_filled_compartments = min(num_compartments - 1, (len(balls) + capacity - 2) // (capacity - 1))
+    tubes = [bytearray() for _ in range(num_compartments)]
+    for i, ball in enumerate(balls):
+        tubes[i % num_filled_compartments].append(ball)
+    return Board(tubes, level_data["balls_per_color"], capacity)
@@ -0,0 +1,122 @@
+# Hint service: a solver running in a worker process, fed the board every
+# time a move lands, so asking for a hint never stalls the event loop. A
+# thread here hands boards to the worker and files its answers; the search
+# itself runs outside this interpreter so it doesn't hold the GIL against
+# the frame loop.
+# Every position on a solution path is remembered in a bounded LRU memo keyed
+# on the solver's canonical board form, together with its next move. Going
+# back over an undone move, or reaching a position that only differs by tube
+# order or color names, is answered straight from the memo.
+import multiprocessing
+import threading
+from collections import OrderedDict
+
+from solver import SearchLimitExceeded, canonical_key, relabel_table, solve
+
+PENDING = "pending"          # not solved yet; ask again later
+UNSOLVABLE = "unsolvable"    # no solution from here
+TOO_BIG = "too big"          # gave up: the search passed max_states
+
+
+def _translated(tubes):
+    table = relabel_table(sorted(tubes))
+    return [tube.translate(table) for tube in tubes]
+
+
+# Worker process: solve each board received on conn and send back the moves,
+# None when there is no solution, or TOO_BIG
+def _serve(conn, max_states):
+    while True:
+        try:
+            board = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = solve(board, max_states=max_states, exhaustive=False)
+        except SearchLimitExceeded:
+            result = TOO_BIG
+        conn.send(result)
+
+
+class HintService:
+    def __init__(self, max_entries=4096, max_states=200_000):
+        self.max_entries = max_entries
+        self.max_states = max_states
+        # canonical key -> (from tube, to tube) in canonical colors, None
+        # when the position has no solution, or TOO_BIG
+        self.memo = OrderedDict()
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.pending = None
+        # Spawned rather than forked: this process has threads and a display
+        context = multiprocessing.get_context("spawn")
+        self.conn, worker_conn = context.Pipe()
+        self.worker = context.Process(target=_serve, args=(worker_conn, max_states),
+                                      name="hint-solver", daemon=True)
+        self.worker.start()
+        worker_conn.close()
+        self.thread = threading.Thread(target=self._run, name="hint-feeder", daemon=True)
+        self.thread.start()
+
+    # Stop the worker, abandoning any search in progress
+    def close(self):
+        self.worker.terminate()
+        self.worker.join()
+        self.conn.close()
+
+    # Queue a board for solving. Only the latest request is kept.
+    def request(self, board):
+        with self.lock:
+            self.pending = board
+            self.wake.notify()
+
+    # Next move for board as (src, dst), or PENDING, UNSOLVABLE or TOO_BIG
+    def hint(self, board):
+        key = canonical_key(board.tubes)
+        with self.lock:
+            if key not in self.memo:
+                if self.pending is not board:
+                    self.pending = board
+                    self.wake.notify()
+                return PENDING
+            self.memo.move_to_end(key)
+            entry = self.memo[key]
+        if entry is None:
+            return UNSOLVABLE
+        if entry == TOO_BIG:
+            return TOO_BIG
+        src_tube, dst_tube = entry
+        tubes = _translated(board.tubes)
+        src = tubes.index(src_tube)
+        dst = next(j for j, tube in enumerate(tubes) if j != src and tube == dst_tube)
+        return src, dst
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.memo[key] = entry
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.max_entries:
+                self.memo.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while self.pending is None:
+                    self.wake.wait()
+                board, self.pending = self.pending, None
+                known = canonical_key(board.tubes) in self.memo
+            if known:
+                continue
+            try:
+                self.conn.send(board)
+                moves = self.conn.recv()
+            except (EOFError, OSError):
+                return  # closed
+            if moves == TOO_BIG or not moves:
+                self._remember(canonical_key(board.tubes), moves or None)
+                continue
+            # Remember the next move for every position along the path
+            for src, dst in moves:
+                tubes = _translated(board.tubes)
+                self._remember(canonical_key(board.tubes), (tubes[src], tubes[dst]))
+                board = board.apply_move(src, dst)
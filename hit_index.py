@@ -0,0 +1,23 @@
+# Uniform-grid spatial index for hit testing. Rectangles are bucketed into
+# square cells once when a layout is built; a point lookup then only checks
+# the few rectangles sharing its cell, however many there are in total.
+
+
+class HitGrid:
+    def __init__(self, rects, cell_size):
+        # rects are (x, y, width, height); edges count as inside
+        self.rects = [tuple(rect) for rect in rects]
+        self.cell_size = cell_size
+        self.cells = {}
+        for index, (x, y, width, height) in enumerate(self.rects):
+            for cell_x in range(x // cell_size, (x + width) // cell_size + 1):
+                for cell_y in range(y // cell_size, (y + height) // cell_size + 1):
+                    self.cells.setdefault((cell_x, cell_y), []).append(index)
+
+    # Index of the rect containing (x, y), or None
+    def hit(self, x, y):
+        for index in self.cells.get((x // self.cell_size, y // self.cell_size), ()):
+            left, top, width, height = self.rects[index]
+            if left <= x <= left + width and top <= y <= top + height:
+                return index
+        return None
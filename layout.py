@@ -0,0 +1,40 @@
+# Board layout: where each tube sits in board coordinates, worked out once per
+# level. Tubes are placed on a regular grid, row by row, so the tubes inside
+# any view rectangle come straight from row and column arithmetic without
+# looking at the rest. Drawing and damage checks only ever touch those, which
+# keeps frame cost tied to the visible area rather than the board size.
+
+
+class GridLayout:
+    def __init__(self, count, cols, left, top, pitch_x, pitch_y, cell_width, cell_height):
+        self.count = count
+        self.cols = max(1, cols)
+        self.rows = (count + self.cols - 1) // self.cols
+        self.left = left
+        self.top = top
+        self.pitch_x = pitch_x
+        self.pitch_y = pitch_y
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+
+    # Top-left corner of cell index
+    def position(self, index):
+        row, col = divmod(index, self.cols)
+        return (self.left + col * self.pitch_x, self.top + row * self.pitch_y)
+
+    # Lowest y covered by any cell
+    def bottom(self):
+        return self.top + (self.rows - 1) * self.pitch_y + self.cell_height if self.count else self.top
+
+    # Indices of the cells that may overlap the rect (x, y, width, height),
+    # padded by one row and column for anything drawn past a cell's edge
+    def visible(self, x, y, width, height):
+        first_row = max(0, (y - self.top) // self.pitch_y - 1)
+        last_row = min(self.rows - 1, (y + height - self.top) // self.pitch_y + 1)
+        first_col = max(0, (x - self.left) // self.pitch_x - 1)
+        last_col = min(self.cols - 1, (x + width - self.left) // self.pitch_x + 1)
+        indices = []
+        for row in range(first_row, last_row + 1):
+            start = row * self.cols
+            indices.extend(range(start + first_col, min(start + last_col + 1, self.count)))
+        return indices
@@ -0,0 +1,207 @@
+# Solvable level generator and on-disk deal cache.
+# Every deal is derived from a seed, checked with the solver against the
+# level's move_limit and stored with its optimal move count (the difficulty
+# score). Each seed tries several solvable candidates and keeps the hardest,
+# so the stored deals are not the easy end of what the level can produce.
+# Generation fans out over a process pool; results go to a compact indexed
+# deal file so the game can pick a verified deal in O(1) at level start:
+#   python level_generator.py --deals 500 --workers 8
+import argparse
+import math
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import Board, deal, level_capacity
+from levels import LEVELS
+from solver import solve
+
+DEAL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "deals.bin")
+
+MAGIC = b"BSDL"
+VERSION = 2
+HEADER = struct.Struct("<4sHH")
+# Per level: record offset, record count, then the level's shape: tubes per
+# board, capacity, balls per color, number of colors and move_limit
+LEVEL_ENTRY = struct.Struct("<QIHBBHH")
+NO_MOVE_LIMIT = 0xFFFF
+
+# Solvable candidates compared per seed. A seed keeps drawing, up to
+# MAX_CANDIDATES, until its hardest candidate needs at least TARGET_SHARE of
+# the level's move_limit.
+DEAL_CANDIDATES = 16
+MAX_CANDIDATES = 64
+TARGET_SHARE = 0.25
+# Per deal: seed, optimal move count, then the packed board
+RECORD = struct.Struct("<QH")
+
+
+# What a level's stored deals were generated for. Deals only stay valid while
+# the live level still has the same shape.
+def level_shape(level_data):
+    move_limit = level_data["move_limit"]
+    return (level_data["compartments"], level_capacity(level_data), level_data["balls_per_color"],
+            len(level_data["colors"]), NO_MOVE_LIMIT if move_limit is None else move_limit)
+
+
+# Scramble a solved board by playing moves backwards. Undoing a move takes the
+# top ball off a sorted tube and puts it on any tube with room, so the result
+# is always solvable. Only one-color tubes can give up a ball, so the walk
+# soon runs out of moves that mix further, and its boards sit close to solved.
+def scramble(level_data, rng, steps):
+    per_color = level_data["balls_per_color"]
+    capacity = level_capacity(level_data)
+    num_colors = len(level_data["colors"])
+    tubes = [bytearray([color] * per_color) for color in range(num_colors)]
+    tubes += [bytearray() for _ in range(level_data["compartments"] - num_colors)]
+    for _ in range(steps):
+        sources = [i for i, tube in enumerate(tubes) if tube and tube.count(tube[0]) == len(tube)]
+        if not sources:
+            break
+        src = rng.choice(sources)
+        targets = [j for j, tube in enumerate(tubes) if j != src and len(tube) < capacity]
+        tubes[rng.choice(targets)].append(tubes[src].pop())
+    rng.shuffle(tubes)
+    return Board(tubes, per_color, capacity)
+
+
+# Produce the deal for one seed. Each candidate is the game's own shuffle,
+# or, when that can't be won inside move_limit (most deals past level 4), a
+# reverse scramble of random length. The candidate with the longest optimal
+# solution is kept. Returns (seed, board, optimal_length).
+def generate_deal(level, seed, candidates=DEAL_CANDIDATES, max_candidates=MAX_CANDIDATES):
+    level_data = LEVELS[level - 1]
+    move_limit = level_data["move_limit"]
+    target = math.ceil(TARGET_SHARE * move_limit) if move_limit is not None else 0
+    rng = random.Random(seed)
+    steps = 4 * len(level_data["colors"]) * level_data["balls_per_color"]
+    best = None
+    tries = 0
+    while best is None or tries < candidates or (best[1] < target and tries < max_candidates):
+        board = deal(level_data, rng)
+        moves = solve(board, move_limit)
+        while not moves:
+            board = scramble(level_data, rng, rng.randint(1, steps))
+            moves = solve(board, move_limit)
+        tries += 1
+        if best is None or len(moves) > best[1]:
+            best = (board, len(moves))
+    return seed, best[0], best[1]
+
+
+def _generate_deal(args):
+    return generate_deal(*args)
+
+
+def generate_level_deals(level, count, first_seed=0, workers=None):
+    jobs = [(level, seed) for seed in range(first_seed, first_seed + count)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_generate_deal, jobs, chunksize=max(1, count // 64)))
+
+
+def write_deal_file(path, deals_by_level):
+    # deals_by_level maps level number -> list of (seed, board, optimal_length)
+    entries = []
+    offset = HEADER.size + LEVEL_ENTRY.size * len(LEVELS)
+    for level in range(1, len(LEVELS) + 1):
+        level_data = LEVELS[level - 1]
+        deals = sorted(deals_by_level.get(level, []), key=lambda item: item[0])
+        shape = level_shape(level_data)
+        entries.append((offset, len(deals)) + shape)
+        offset += len(deals) * (RECORD.size + shape[0] * shape[1])
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(LEVELS)))
+        for entry in entries:
+            f.write(LEVEL_ENTRY.pack(*entry))
+        for level in range(1, len(LEVELS) + 1):
+            for seed, board, length in sorted(deals_by_level.get(level, []), key=lambda item: item[0]):
+                f.write(RECORD.pack(seed, length))
+                f.write(board.pack())
+    os.replace(tmp_path, path)
+
+
+# Read-only view of a deal file. Only the header is loaded; each lookup is a
+# single seek and read. Levels whose stored shape no longer matches levels
+# (the file predates an edit to LEVELS) report no deals, so level_deal()
+# generates those levels' deals instead.
+class DealFile:
+    def __init__(self, path, levels=LEVELS):
+        self.file = open(path, "rb")
+        magic, version, num_levels = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError(f"{path} is not a version {VERSION} deal file")
+        self.levels = [LEVEL_ENTRY.unpack(self.file.read(LEVEL_ENTRY.size)) for _ in range(num_levels)]
+        self.current = [level < len(levels) and entry[2:] == level_shape(levels[level])
+                        for level, entry in enumerate(self.levels)]
+
+    def close(self):
+        self.file.close()
+
+    def count(self, level):
+        if not 1 <= level <= len(self.levels) or not self.current[level - 1]:
+            return 0
+        return self.levels[level - 1][1]
+
+    def get(self, level, index):
+        offset, count, num_tubes, capacity, per_color, _, _ = self.levels[level - 1]
+        if not 0 <= index < count:
+            raise IndexError(f"level {level} has {count} deals")
+        record_size = RECORD.size + num_tubes * capacity
+        self.file.seek(offset + index * record_size)
+        data = self.file.read(record_size)
+        seed, length = RECORD.unpack_from(data)
+        return seed, Board.unpack(data[RECORD.size:], per_color, capacity), length
+
+    def random_deal(self, level, rng=None):
+        rng = rng if rng is not None else random
+        count = self.count(level)
+        return self.get(level, rng.randrange(count)) if count else None
+
+
+# The deal the game plays for level from seed, as (deal id, board). With a
+# deal file that has the level, the board is one of its verified deals and
+# the id is that deal's own seed. Without one the deal is generated on the
+# spot from seed, with a single candidate so it stays quick (up to about
+# 200 ms on level 10): still verified winnable, just not picked for
+# difficulty. The replay verifier re-derives boards the same way.
+def level_deal(level, seed, deals=None):
+    verified = deals.random_deal(level, random.Random(seed)) if deals else None
+    if verified:
+        return verified[0], verified[1]
+    seed, board, _ = generate_deal(level, seed, candidates=1, max_candidates=1)
+    return seed, board
+
+
+def open_deal_file(path=DEAL_FILE):
+    if not os.path.exists(path):
+        return None
+    try:
+        return DealFile(path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate verified solvable deals for every level.")
+    parser.add_argument("--deals", type=int, default=200, help="deals per level")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default=DEAL_FILE)
+    args = parser.parse_args()
+
+    deals_by_level = {}
+    for level in range(1, len(LEVELS) + 1):
+        deals = generate_level_deals(level, args.deals, args.first_seed, args.workers)
+        lengths = [length for _, _, length in deals]
+        print(f"Level {level}: {len(deals)} deals, optimal moves {min(lengths)}-{max(lengths)}, "
+              f"mean {sum(lengths) / len(lengths):.1f}")
+        deals_by_level[level] = deals
+    write_deal_file(args.out, deals_by_level)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
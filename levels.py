@@ -0,0 +1,56 @@
+# Colors and level definitions shared by the game and the headless tools.
+# Nothing in here touches pygame, so it is safe to import anywhere.
+# A level may also set "capacity" (balls per tube, default 5).
+import colorsys
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+YELLOW = (255, 255, 0)
+GRAY = (200, 200, 200)
+GREEN = (0, 255, 0)
+PURPLE = (128, 0, 128)
+ORANGE = (255, 165, 0)
+CYAN = (0, 255, 255)
+LIGHT_BLUE = (173, 216, 230)
+
+# Seconds allowed per level
+TIME_LIMIT = 180
+
+# Define levels
+LEVELS = [
+    {"colors": [RED, BLUE, YELLOW], "balls_per_color": 2, "compartments": 4, "move_limit": None},
+    {"colors": [RED, BLUE, YELLOW, PURPLE], "balls_per_color": 2, "compartments": 5, "move_limit": None},
+    {"colors": [RED, BLUE, YELLOW, PURPLE], "balls_per_color": 3, "compartments": 5, "move_limit": None},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE], "balls_per_color": 3, "compartments": 6, "move_limit": 30},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN], "balls_per_color": 4, "compartments": 7, "move_limit": 40},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN], "balls_per_color": 4, "compartments": 8, "move_limit": 45},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE], "balls_per_color": 4, "compartments": 9, "move_limit": 50},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY], "balls_per_color": 4, "compartments": 10, "move_limit": 55},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK], "balls_per_color": 4, "compartments": 11, "move_limit": 60},
+    {"colors": [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK], "balls_per_color": 5, "compartments": 12, "move_limit": 70},
+]
+
+
+# Boards store each ball as a byte, with 0xFF marking an empty slot
+MAX_COLORS = 254
+
+
+# Build a level of any size. Colors past the named ones are spread evenly
+# around the hue wheel.
+def make_level(num_colors, balls_per_color, compartments, capacity=None, move_limit=None):
+    if num_colors > MAX_COLORS:
+        raise ValueError(f"at most {MAX_COLORS} colors fit a board, not {num_colors}")
+    named = [RED, BLUE, YELLOW, PURPLE, ORANGE, CYAN, GREEN, LIGHT_BLUE, GRAY, BLACK]
+    colors = named[:num_colors]
+    extra = num_colors - len(colors)
+    for i in range(extra):
+        r, g, b = colorsys.hsv_to_rgb((i + 0.5) / extra, 0.75 if i % 2 else 0.5, 0.9)
+        colors.append((int(r * 255), int(g * 255), int(b * 255)))
+    level = {"colors": colors, "balls_per_color": balls_per_color, "compartments": compartments,
+             "move_limit": move_limit}
+    if capacity is not None:
+        level["capacity"] = capacity
+    return level
@@ -0,0 +1,124 @@
+# Load test for server.py. Opens many connections, starts sessions on each,
+# plays random legal moves against them (boards are mirrored client-side with
+# the engine) and reports session starts/sec, moves/sec and move round-trip
+# latency. By default the server runs in-process on a free port. The memory
+# an open session costs is measured separately, without sockets, since
+# tracing allocations would slow the timed run down:
+#   python loadtest.py --sessions 2000 --connections 50 --moves 20
+#   python loadtest.py --connect 127.0.0.1:8765
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from engine import Board
+from server import GameServer
+
+
+# Bytes allocated per session for count sessions spread over every level
+def session_footprint(count=2000, seed=1):
+    server = GameServer(seed=seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        server.handle({"op": "start", "level": i % 10 + 1})
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else 0.0
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def call(self, **request):
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        reply = json.loads(await self.reader.readline())
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+
+async def run_connection(host, port, num_sessions, num_moves, rng, stats, started):
+    client = Client(*await asyncio.open_connection(host, port))
+    boards = {}
+    for _ in range(num_sessions):
+        reply = await client.call(op="start", level=rng.randint(1, 10))
+        boards[reply["session"]] = Board(reply["tubes"], 1, reply["capacity"])
+        stats["sessions"] += 1
+    started.append(time.perf_counter())
+
+    # Round-robin over this connection's sessions, one legal move at a time;
+    # a session whose level ends is simply left alone
+    for _ in range(num_moves):
+        for session_id, board in list(boards.items()):
+            moves = board.legal_moves()
+            if not moves:
+                del boards[session_id]
+                continue
+            src, dst = rng.choice(moves)
+            start = time.perf_counter()
+            reply = await client.call(op="move", session=session_id, src=src, dst=dst)
+            stats["latency"].append(time.perf_counter() - start)
+            if reply["outcome"] == "in progress":
+                boards[session_id] = board.apply_move(src, dst)
+            else:
+                del boards[session_id]
+    client.writer.close()
+
+
+async def load_test(args):
+    server = None
+    host, port = "127.0.0.1", 0
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        port = int(port)
+    else:
+        server = await GameServer(seed=args.seed).start(host, 0)
+        port = server.sockets[0].getsockname()[1]
+
+    rng = random.Random(args.seed)
+    stats = {"sessions": 0, "latency": []}
+    started = []
+    per_connection = max(1, args.sessions // args.connections)
+    begin = time.perf_counter()
+    tasks = [run_connection(host, port, per_connection, args.moves, random.Random(rng.getrandbits(32)), stats, started)
+             for _ in range(args.connections)]
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - begin
+    setup = max(started) - begin
+
+    latency = stats["latency"]
+    print(f"{stats['sessions']} sessions over {args.connections} connections in {setup:.2f}s "
+          f"({stats['sessions'] / setup:,.0f} sessions/s)")
+    print(f"{len(latency)} moves in {elapsed - setup:.2f}s ({len(latency) / max(elapsed - setup, 1e-9):,.0f} moves/s)")
+    print(f"move latency p50 {percentile(latency, 50) * 1000:.2f}ms  p95 {percentile(latency, 95) * 1000:.2f}ms  "
+          f"p99 {percentile(latency, 99) * 1000:.2f}ms")
+    if server:
+        server.close()
+        await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ball sorting game server.")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--moves", type=int, default=20, help="move rounds per connection")
+    parser.add_argument("--connect", help="host:port of a running server; default starts one in-process")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(load_test(args))
+    print(f"{session_footprint(seed=args.seed) / 1024:.1f} KiB allocated per session")
+
+
+if __name__ == "__main__":
+    main()
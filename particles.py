@@ -0,0 +1,114 @@
+# Start-screen ball animation as a struct-of-arrays particle system.
+# Positions, velocities and wobble phases live in NumPy arrays and every
+# fixed step integrates, bounces and collides all balls at once. Ball-to-ball
+# collisions go through a spatial hash of cells one ball wide, so each ball is
+# only tested against the balls in its own and the eight neighbouring cells.
+# Frames are drawn with a single Surface.blits call.
+import numpy as np
+import pygame
+
+CELL_SLOTS = 8  # Balls remembered per hash cell; more only happens when heavily overlapped
+
+
+class ParticleSystem:
+    def __init__(self, count, width, height, radius, colors, sprites=None, collide=True, seed=None):
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.collide = collide
+        self.pos = np.column_stack([rng.uniform(radius, width - radius, count),
+                                    rng.uniform(radius, height - radius, count)])
+        self.prev = self.pos.copy()
+        self.vel = rng.uniform(-3, 3, (count, 2))  # pixels per step
+        self.phase = rng.uniform(0, 2 * np.pi, count)
+        self.color = rng.integers(0, len(colors), count)
+
+        # One image per color; colors without a sprite get a plain circle
+        images = []
+        for color in colors:
+            image = sprites.get(color) if sprites else None
+            if image is None:
+                image = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+                pygame.draw.circle(image, color, (radius, radius), radius)
+            images.append(image)
+        self.images = [images[c] for c in self.color]
+
+    def __len__(self):
+        return len(self.pos)
+
+    # One fixed simulation step: move, wobble, bounce off walls and each other
+    def step(self):
+        self.prev[:] = self.pos
+        self.pos += self.vel
+        self.phase += 0.1
+        self.pos[:, 0] += np.sin(self.phase) * 2
+
+        r = self.radius
+        limits = np.array([self.width - r, self.height - r])
+        out = (self.pos < r) | (self.pos > limits)
+        self.vel[out] = -self.vel[out]
+
+        if self.collide and len(self.pos) > 1:
+            self._collide()
+        np.clip(self.pos, r, limits, out=self.pos)
+
+    # Candidate pairs (i, j), i < j, of balls in the same or adjacent cells
+    def _pairs(self):
+        cell_size = self.radius * 2
+        cells = (self.pos // cell_size).astype(np.intp)
+        grid_w = int(self.width // cell_size) + 1
+        grid_h = int(self.height // cell_size) + 1
+        np.clip(cells[:, 0], 0, grid_w - 1, out=cells[:, 0])
+        np.clip(cells[:, 1], 0, grid_h - 1, out=cells[:, 1])
+
+        # Rank of each ball within its cell, from a sort by cell key
+        keys = cells[:, 0] * grid_h + cells[:, 1]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        first = np.searchsorted(sorted_keys, sorted_keys, side="left")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order)) - first
+        kept = rank < CELL_SLOTS
+
+        # Grid padded by one cell on each side so neighbour lookups never wrap
+        grid = np.full((grid_w + 2, grid_h + 2, CELL_SLOTS), -1, dtype=np.intp)
+        grid[cells[kept, 0] + 1, cells[kept, 1] + 1, rank[kept]] = np.nonzero(kept)[0]
+
+        offsets = np.array([(dx, dy) for dx in (0, 1, 2) for dy in (0, 1, 2)])
+        neighbour_cells = cells[:, None, :] + offsets[None, :, :]
+        candidates = grid[neighbour_cells[:, :, 0], neighbour_cells[:, :, 1]].reshape(len(cells), -1)
+        i = np.broadcast_to(np.arange(len(cells))[:, None], candidates.shape)
+        mask = candidates > i
+        return i[mask], candidates[mask]
+
+    def _collide(self):
+        i, j = self._pairs()
+        if not len(i):
+            return
+        delta = self.pos[j] - self.pos[i]
+        dist = np.hypot(delta[:, 0], delta[:, 1])
+        touching = (dist < self.radius * 2) & (dist > 0)
+        i, j, delta, dist = i[touching], j[touching], delta[touching], dist[touching]
+        if not len(i):
+            return
+        normal = delta / dist[:, None]
+
+        # Equal masses: swap the velocity components along the normal, but
+        # only for pairs still moving towards each other
+        closing = np.einsum("ij,ij->i", self.vel[i] - self.vel[j], normal)
+        approaching = closing > 0
+        impulse = normal[approaching] * closing[approaching, None]
+        np.subtract.at(self.vel, i[approaching], impulse)
+        np.add.at(self.vel, j[approaching], impulse)
+
+        # Push overlapping balls apart so they don't stick together
+        push = normal * ((self.radius * 2 - dist) / 2)[:, None]
+        np.subtract.at(self.pos, i, push)
+        np.add.at(self.pos, j, push)
+
+    # Draw between the last two steps; alpha is how far into the next step
+    # the frame falls
+    def draw(self, surface, alpha=1.0):
+        pos = self.prev + (self.pos - self.prev) * alpha - self.radius
+        surface.blits(zip(self.images, pos.astype(np.int32).tolist()), doreturn=False)
@@ -0,0 +1,96 @@
+# Frame-time profiler for the main loop.
+# Named sections (event handling, game logic, drawing, each compartment draw)
+# are timed with perf_counter into rolling windows, summarized as
+# p50/p95/p99 and optionally shown as an overlay. The recent timeline can be
+# exported as CSV or as Chrome trace JSON (open it in chrome://tracing or
+# Perfetto).
+import csv
+import json
+import time
+from collections import deque
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class FrameProfiler:
+    def __init__(self, enabled=True, window=600, trace_events=20000):
+        self.enabled = enabled
+        self.window = window
+        self.samples = {}
+        self.events = deque(maxlen=trace_events)
+        self.frame = 0
+        self.origin = time.perf_counter()
+
+    # with profiler.section("draw"): ...
+    def section(self, name):
+        return _Section(self, name) if self.enabled else _NULL_SECTION
+
+    def record(self, name, start, end):
+        if not self.enabled:
+            return
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(end - start)
+        self.events.append((self.frame, name, start, end))
+
+    def next_frame(self):
+        self.frame += 1
+
+    # Percentiles in milliseconds over the rolling window
+    def stats(self, name):
+        samples = sorted(self.samples.get(name, ()))
+        if not samples:
+            return None
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+        return {"count": len(samples), "p50": percentile(50), "p95": percentile(95), "p99": percentile(99),
+                "max": samples[-1] * 1000}
+
+    def summary_lines(self):
+        lines = []
+        for name in sorted(self.samples):
+            stats = self.stats(name)
+            lines.append(f"{name}: p50 {stats['p50']:.2f} p95 {stats['p95']:.2f} p99 {stats['p99']:.2f} ms")
+        return lines
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "section", "start_ms", "duration_ms"])
+            for frame, name, start, end in self.events:
+                writer.writerow([frame, name, f"{(start - self.origin) * 1000:.3f}", f"{(end - start) * 1000:.3f}"])
+
+    def export_chrome_trace(self, path):
+        trace = [{"name": name, "ph": "X", "pid": 1, "tid": 1, "ts": (start - self.origin) * 1e6,
+                  "dur": (end - start) * 1e6, "args": {"frame": frame}}
+                 for frame, name, start, end in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
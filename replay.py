@@ -0,0 +1,238 @@
+# Replay recording and verification.
+# Every level attempt is logged as one compact binary record: the level, the
+# deal seed and starting board, then each attempted move as
+# (from_tube, to_tube, milliseconds since the level started) and the outcome
+# the game reported. A session file is just these records back to back.
+# The headless verifier replays records through the engine with no
+# rendering, re-checking every move and the claimed outcome. It first checks
+# the record against the live level: the limits must be the level's, and the
+# starting board must be the one the game deals for the recorded seed
+# (generated from it, or the deal file's pick when deals.bin is present):
+#   python replay.py replays/*.bsr
+import glob
+import os
+import struct
+import sys
+import time
+from collections import Counter
+
+from engine import Board, level_capacity
+from level_generator import level_deal, open_deal_file
+from levels import LEVELS, TIME_LIMIT
+
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays")
+
+MAGIC = b"BSRG"
+VERSION = 2
+# magic, version, level, seed, move limit, time limit (s), tubes, balls per
+# color, capacity, move count, outcome, end time (ms). Moves are from tube,
+# to tube, ms. Version 1 stored tube numbers in one byte.
+HEADERS = {1: struct.Struct("<4sBBQHHBBBHBI"), 2: struct.Struct("<4sBBQHHHBBHBI")}
+MOVES = {1: struct.Struct("<BBI"), 2: struct.Struct("<HHI")}
+HEADER = HEADERS[VERSION]
+MOVE = MOVES[VERSION]
+NO_MOVE_LIMIT = 0xFFFF
+# Undo and redo are logged as moves with both tubes set to these markers
+UNDO = 0xFFFF
+REDO = 0xFFFE
+
+# Outcomes
+IN_PROGRESS = 0   # session ended mid-level
+WIN = 1
+ILLEGAL_DROP = 2  # game over: ball dropped on a compartment that can't take it
+STUCK = 3         # game over: no legal move left
+OUT_OF_MOVES = 4  # game over: move_limit reached
+TIME_UP = 5
+OUTCOME_NAMES = {IN_PROGRESS: "in progress", WIN: "win", ILLEGAL_DROP: "illegal drop", STUCK: "stuck",
+                 OUT_OF_MOVES: "out of moves", TIME_UP: "time up"}
+
+# Moves are timestamped when the event is handled, but the time limit is only
+# checked once per frame, so allow one slow frame past it
+TIME_SLACK_MS = 250
+
+
+class ReplayGame:
+    __slots__ = ("level", "seed", "board", "move_limit", "time_limit", "moves", "outcome", "end_ms")
+
+    def __init__(self, level, seed, board, move_limit, time_limit, moves=None, outcome=IN_PROGRESS, end_ms=0):
+        self.level = level
+        self.seed = seed
+        self.board = board
+        self.move_limit = move_limit
+        self.time_limit = time_limit
+        self.moves = moves if moves is not None else []
+        self.outcome = outcome
+        self.end_ms = end_ms
+
+    def encode(self):
+        board = self.board
+        header = HEADER.pack(MAGIC, VERSION, self.level, self.seed,
+                             NO_MOVE_LIMIT if self.move_limit is None else self.move_limit,
+                             self.time_limit, len(board.tubes), board.per_color, board.capacity,
+                             len(self.moves), self.outcome, self.end_ms)
+        return header + board.pack() + b"".join(MOVE.pack(*move) for move in self.moves)
+
+
+# Yield every ReplayGame stored in data
+def decode_games(data):
+    offset = 0
+    while offset < len(data):
+        header = HEADERS.get(data[offset + 4]) if data[offset:offset + 4] == MAGIC else None
+        if header is None:
+            raise ValueError(f"bad replay record at byte {offset}")
+        (magic, version, level, seed, move_limit, time_limit, num_tubes, per_color, capacity,
+         num_moves, outcome, end_ms) = header.unpack_from(data, offset)
+        offset += header.size
+        board = Board.unpack(data[offset:offset + num_tubes * capacity], per_color, capacity)
+        offset += num_tubes * capacity
+        move = MOVES[version]
+        moves = list(move.iter_unpack(data[offset:offset + num_moves * move.size]))
+        offset += num_moves * move.size
+        yield ReplayGame(level, seed, board, None if move_limit == NO_MOVE_LIMIT else move_limit,
+                         time_limit, moves, outcome, end_ms)
+
+
+def read_games(path):
+    with open(path, "rb") as f:
+        return list(decode_games(f.read()))
+
+
+# Collects the current level attempt and appends it to the session file
+# once it ends
+class ReplayRecorder:
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(REPLAY_DIR, time.strftime("session-%Y%m%d-%H%M%S.bsr"))
+        self.path = path
+        self.game = None
+
+    def start(self, level, seed, board, move_limit, time_limit):
+        self.close()
+        self.game = ReplayGame(level, seed, board, move_limit, time_limit)
+
+    def move(self, src, dst, elapsed):
+        if self.game is not None:
+            self.game.moves.append((src, dst, int(elapsed * 1000)))
+            self.game.end_ms = int(elapsed * 1000)
+
+    def undo(self, elapsed):
+        self.move(UNDO, UNDO, elapsed)
+
+    def redo(self, elapsed):
+        self.move(REDO, REDO, elapsed)
+
+    def finish(self, outcome, elapsed):
+        if self.game is None:
+            return
+        self.game.outcome = outcome
+        self.game.end_ms = int(elapsed * 1000)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(self.game.encode())
+        self.game = None
+
+    def close(self):
+        if self.game is not None:
+            self.finish(IN_PROGRESS, self.game.end_ms / 1000)
+
+
+# Whether the record's level, limits and starting board are what the game
+# would have set up. Returns None, or a short description of the mismatch.
+def check_setup(game, deals=None):
+    if not 1 <= game.level <= len(LEVELS):
+        return f"level {game.level} doesn't exist"
+    level_data = LEVELS[game.level - 1]
+    board = game.board
+    if (len(board.tubes) != level_data["compartments"] or board.capacity != level_capacity(level_data)
+            or board.per_color != level_data["balls_per_color"]):
+        return "starting board has the wrong tubes, capacity or balls per color for the level"
+    num_colors = len(level_data["colors"])
+    if Counter(ball for tube in board.tubes for ball in tube) != dict.fromkeys(range(num_colors), board.per_color):
+        return "starting board has the wrong balls for the level"
+    if game.move_limit != level_data["move_limit"] or game.time_limit != TIME_LIMIT:
+        return "move or time limit differs from the level's"
+    # The deal file's pick is a lookup; generating the deal runs the solver
+    if deals and board == level_deal(game.level, game.seed, deals)[1]:
+        return None
+    if board != level_deal(game.level, game.seed)[1]:
+        return f"starting board isn't the deal for seed {game.seed}"
+    return None
+
+
+# Replay one game through the engine. Returns None if the setup checks out,
+# every move was legal and the recorded outcome is what the game should have
+# reported, otherwise a short description of the first problem. Undo restores
+# the board and move count from before the last move, as the game does.
+def verify(game, deals=None):
+    problem = check_setup(game, deals)
+    if problem:
+        return problem
+    board = game.board
+    time_limit_ms = game.time_limit * 1000
+    last_ms = 0
+    applied = 0
+    history = []
+    future = []
+    for number, (src, dst, ms) in enumerate(game.moves, start=1):
+        if ms < last_ms:
+            return f"move {number} goes back in time"
+        if ms >= time_limit_ms + TIME_SLACK_MS:
+            return f"move {number} came after the time limit"
+        last_ms = ms
+        if board.is_solved() or board.is_stuck():
+            return f"move {number} came after the level had ended"
+        if game.move_limit is not None and applied >= game.move_limit:
+            return f"move {number} came after the move limit"
+        if src in (UNDO, REDO):
+            stack, other = (history, future) if src == UNDO else (future, history)
+            if not stack:
+                return f"move {number} has nothing to {'undo' if src == UNDO else 'redo'}"
+            other.append((board, applied))
+            board, applied = stack.pop()
+            continue
+        if src >= len(board.tubes) or dst >= len(board.tubes) or not board.tubes[src]:
+            return f"move {number} picks from an empty or missing tube"
+        if not board.is_legal(src, dst):
+            if number == len(game.moves) and game.outcome == ILLEGAL_DROP:
+                return None
+            return f"move {number} ({src} -> {dst}) is not a legal drop"
+        history.append((board, applied))
+        future.clear()
+        board = board.apply_move(src, dst)
+        applied += 1
+
+    if game.outcome == WIN:
+        ok = board.is_solved() and game.end_ms < time_limit_ms + TIME_SLACK_MS
+    elif game.outcome == ILLEGAL_DROP:
+        return "illegal drop recorded but the last move was legal"
+    elif game.outcome == STUCK:
+        ok = board.is_stuck() and not board.is_solved()
+    elif game.outcome == OUT_OF_MOVES:
+        ok = game.move_limit is not None and applied >= game.move_limit and not board.is_solved()
+    elif game.outcome == TIME_UP:
+        ok = game.end_ms >= time_limit_ms and not board.is_solved()
+    else:
+        ok = game.outcome == IN_PROGRESS
+    return None if ok else f"recorded {OUTCOME_NAMES.get(game.outcome, game.outcome)} doesn't match the final board"
+
+
+def main(paths):
+    games = failures = 0
+    deals = open_deal_file()
+    start = time.perf_counter()
+    for pattern in paths:
+        for path in glob.glob(pattern):
+            for index, game in enumerate(read_games(path)):
+                games += 1
+                problem = verify(game, deals)
+                if problem:
+                    failures += 1
+                    print(f"{path} game {index + 1} (level {game.level}, seed {game.seed}): {problem}")
+    elapsed = time.perf_counter() - start
+    rate = games / elapsed if elapsed else 0
+    print(f"Verified {games} games, {failures} failed ({rate:,.0f} games/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:] or [os.path.join(REPLAY_DIR, "*.bsr")]))
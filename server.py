@@ -0,0 +1,233 @@
+# Headless multi-session game server.
+# Each player gets a GameSession holding what the pygame loop keeps in globals
+# (level, board, move count, timer, lives, and whether the level was won or
+# lost), played by the same rules. Clients talk to it over a local TCP socket,
+# one JSON object per line, and do their own rendering:
+#   {"op": "start", "level": 1}                       -> new session
+#   {"op": "move", "session": 7, "src": 0, "dst": 3}
+#   {"op": "state" | "next" | "retry" | "restart" | "close", "session": 7}
+# Every request gets exactly one JSON line back, in order. A connection can
+# only use the sessions it started, and they are closed when it drops.
+#   python server.py [--host 127.0.0.1] [--port 8765]
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from engine import deal
+from level_generator import open_deal_file
+from levels import LEVELS, TIME_LIMIT
+from replay import IN_PROGRESS, WIN, ILLEGAL_DROP, STUCK, OUT_OF_MOVES, TIME_UP, OUTCOME_NAMES
+
+MAX_LINE = 4096
+
+
+class SessionError(ValueError):
+    pass
+
+
+# A request field that must be a JSON integer. Floats (1e400 overflows int())
+# and booleans are refused rather than converted.
+def integer(request, field, default=None):
+    value = request.get(field, default)
+    if type(value) is not int:
+        raise SessionError(f"{field} must be an integer")
+    return value
+
+
+# One player's game. Outcomes are the replay module's: IN_PROGRESS while the
+# level is being played, then WIN or one of the ways to lose it.
+class GameSession:
+    __slots__ = ("id", "level", "board", "move_count", "move_limit", "lives", "outcome", "started", "ended")
+
+    def __init__(self, session_id, level, deals, rng, now):
+        self.id = session_id
+        self.lives = 1
+        self.start_level(level, deals, rng, now)
+
+    def start_level(self, level, deals, rng, now):
+        if not 1 <= level <= len(LEVELS):
+            raise SessionError(f"no level {level}")
+        # Same source as the game: a verified deal if there is a deal file
+        verified = deals.random_deal(level, rng) if deals else None
+        self.board = verified[1] if verified else deal(LEVELS[level - 1], rng)
+        self.level = level
+        self.move_count = 0
+        self.move_limit = LEVELS[level - 1]["move_limit"]
+        self.outcome = IN_PROGRESS
+        self.started = now
+        self.ended = None
+
+    def elapsed(self, now):
+        return (self.ended if self.ended is not None else now) - self.started
+
+    def finish(self, outcome, now):
+        self.outcome = outcome
+        self.ended = now
+
+    # The timer is only looked at when a request comes in
+    def check_time(self, now):
+        if self.outcome == IN_PROGRESS and now - self.started >= TIME_LIMIT:
+            self.finish(TIME_UP, self.started + TIME_LIMIT)
+
+    def move(self, src, dst, now):
+        self.check_time(now)
+        if self.outcome != IN_PROGRESS:
+            raise SessionError("level is over")
+        tubes = self.board.tubes
+        if not (0 <= src < len(tubes) and 0 <= dst < len(tubes)):
+            raise SessionError("no such tube")
+        if not tubes[src]:
+            raise SessionError("tube is empty")
+        # Dropping a ball back on its own tube is a no-op, as in the game: not
+        # a move, not an illegal drop, and the level goes on
+        if src == dst:
+            return
+        if not self.board.is_legal(src, dst):
+            self.finish(ILLEGAL_DROP, now)
+            return
+        self.board = self.board.apply_move(src, dst)
+        self.move_count += 1
+        if self.board.is_solved():
+            self.lives += 1
+            self.finish(WIN, now)
+        elif self.board.is_stuck():
+            self.finish(STUCK, now)
+        elif self.move_limit is not None and self.move_count >= self.move_limit:
+            self.finish(OUT_OF_MOVES, now)
+
+    def state(self, now):
+        self.check_time(now)
+        return {
+            "session": self.id,
+            "level": self.level,
+            "tubes": [list(tube) for tube in self.board.tubes],
+            "colors": LEVELS[self.level - 1]["colors"],
+            "capacity": self.board.capacity,
+            "move_count": self.move_count,
+            "move_limit": self.move_limit,
+            "time_left": max(0.0, TIME_LIMIT - self.elapsed(now)),
+            "lives": self.lives,
+            "outcome": OUTCOME_NAMES[self.outcome],
+        }
+
+
+class GameServer:
+    def __init__(self, deals=None, seed=None, clock=time.monotonic):
+        self.deals = deals
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.sessions = {}
+        self.next_id = 1
+
+    # The session a request names. owned is the set of session ids started on
+    # the requesting connection, or None for callers inside this process.
+    def session(self, request, owned=None):
+        session_id = request.get("session")
+        session = self.sessions.get(session_id)
+        if session is None or (owned is not None and session_id not in owned):
+            raise SessionError("no such session")
+        return session
+
+    # Handle one decoded request and return the reply
+    def handle(self, request, owned=None):
+        if not isinstance(request, dict):
+            raise SessionError("request must be a JSON object")
+        now = self.clock()
+        op = request.get("op")
+        if op == "start":
+            session = GameSession(self.next_id, integer(request, "level", 1), self.deals, self.rng, now)
+            self.sessions[session.id] = session
+            self.next_id += 1
+            if owned is not None:
+                owned.add(session.id)
+            return session.state(now)
+        session = self.session(request, owned)
+        if op == "move":
+            src, dst = integer(request, "src"), integer(request, "dst")
+            session.move(src, dst, now)
+            # Only the two touched tubes, to keep replies small
+            tubes = session.board.tubes
+            changed = {str(i): list(tubes[i]) for i in (src, dst)}
+            return {"session": session.id, "changed": changed, "move_count": session.move_count,
+                    "outcome": OUTCOME_NAMES[session.outcome]}
+        if op == "state":
+            return session.state(now)
+        if op == "next":
+            if session.outcome != WIN or session.level >= len(LEVELS):
+                raise SessionError("no next level")
+            session.start_level(session.level + 1, self.deals, self.rng, now)
+            return session.state(now)
+        if op == "retry":
+            session.check_time(now)
+            if session.outcome in (IN_PROGRESS, WIN) or session.lives <= 0:
+                raise SessionError("nothing to retry")
+            session.lives -= 1
+            session.start_level(session.level, self.deals, self.rng, now)
+            return session.state(now)
+        if op == "restart":
+            session.lives = 1
+            session.start_level(1, self.deals, self.rng, now)
+            return session.state(now)
+        if op == "close":
+            del self.sessions[session.id]
+            if owned is not None:
+                owned.discard(session.id)
+            return {"session": session.id, "closed": True}
+        raise SessionError(f"unknown op {op!r}")
+
+    def handle_line(self, line, owned=None):
+        try:
+            reply = self.handle(json.loads(line), owned)
+            reply["ok"] = True
+        # RecursionError: a line of deeply nested brackets
+        except (SessionError, KeyError, TypeError, ValueError, RecursionError) as exc:
+            reply = {"ok": False, "error": str(exc)}
+        return json.dumps(reply, separators=(",", ":")).encode() + b"\n"
+
+    async def serve_client(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(self.handle_line(line, owned))
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+
+
+async def serve(host, port):
+    deals = open_deal_file()
+    if deals is None:
+        print("Warning: no deal file, so sessions get live shuffles, which often can't be won "
+              "(run level_generator.py to build deals.bin).")
+    server = await GameServer(deals).start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Serving ball sorting sessions on {address[0]}:{address[1]}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve headless ball sorting game sessions.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# Optimal solver for engine boards.
+# A* over raw tube tuples with an admissible heuristic and a transposition
+# table keyed on a canonical form of the board (tubes sorted, colors relabeled
+# by first appearance), so positions that only differ by which tube is which
+# or which color is which are searched once. When the table would grow past
+# max_states the search switches to IDA*, whose memory stays bounded.
+import heapq
+import itertools
+import random
+import sys
+
+from engine import deal
+from levels import LEVELS
+
+
+class SearchLimitExceeded(RuntimeError):
+    pass
+
+
+# Canonical key: sort the tubes, relabel colors in order of first appearance,
+# then sort again. Two boards with the same key are always equivalent up to
+# tube and color permutation.
+def canonical_key(tubes):
+    ordered = sorted(tubes)
+    table = relabel_table(ordered)
+    relabeled = sorted(tube.translate(table) for tube in ordered)
+    return b"".join(bytes((len(tube),)) + tube for tube in relabeled)
+
+
+# Translation table for bytes.translate that renames the colors of sorted
+# tubes in order of first appearance
+def relabel_table(ordered):
+    table = bytearray(range(256))
+    for new, old in enumerate(dict.fromkeys(b"".join(ordered))):
+        table[old] = new
+    return table
+
+
+# Every ball sitting above a tube's bottom run has to move at least once, and
+# of all the bottom runs sharing a color at most one can stay where it is.
+def heuristic(tubes):
+    estimate = 0
+    runs = {}
+    for tube in tubes:
+        if not tube:
+            continue
+        color = tube[0]
+        run = len(tube) - len(tube.lstrip(bytes((color,))))
+        estimate += len(tube) - run
+        runs.setdefault(color, []).append(run)
+    for color_runs in runs.values():
+        if len(color_runs) > 1:
+            estimate += sum(color_runs) - max(color_runs)
+    return estimate
+
+
+def is_solved(tubes, per_color):
+    for tube in tubes:
+        if tube and (len(tube) != per_color or tube.count(tube[0]) != len(tube)):
+            return False
+    return True
+
+
+# Legal moves, minus moving a ball off a sorted tube into an empty one: the
+# sorted tube already accepts that color, so the move never helps.
+def successors(tubes, capacity):
+    open_targets = []
+    empty_target = -1
+    for j, tube in enumerate(tubes):
+        if not tube:
+            if empty_target == -1:
+                empty_target = j
+        elif len(tube) < capacity and tube.count(tube[0]) == len(tube):
+            open_targets.append(j)
+    for i, tube in enumerate(tubes):
+        if not tube:
+            continue
+        top = tube[-1]
+        sorted_tube = tube.count(top) == len(tube)
+        for j in open_targets:
+            if j != i and tubes[j][0] == top:
+                yield i, j
+        if empty_target != -1 and not sorted_tube:
+            yield i, empty_target
+
+
+def _apply(tubes, src, dst):
+    tubes = list(tubes)
+    ball = tubes[src][-1:]
+    tubes[src] = tubes[src][:-1]
+    tubes[dst] = tubes[dst] + ball
+    return tuple(tubes)
+
+
+def solve(board, bound=None, max_states=2_000_000, exhaustive=True):
+    # Returns a shortest list of (src, dst) moves, or None if the board can't
+    # be solved within bound moves (or at all when bound is None). Without
+    # exhaustive, SearchLimitExceeded is raised instead of falling back to
+    # the slower IDA*.
+    try:
+        return _astar(board, bound, max_states)
+    except SearchLimitExceeded:
+        if not exhaustive:
+            raise
+        return _idastar(board, bound, max_states)
+
+
+def _astar(board, bound, max_states):
+    start = board.tubes
+    per_color = board.per_color
+    capacity = board.capacity
+    counter = itertools.count()
+    best_g = {canonical_key(start): 0}
+    parents = {start: None}
+    heap = [(heuristic(start), 0, next(counter), start)]
+    while heap:
+        f, g, _, tubes = heapq.heappop(heap)
+        if best_g.get(canonical_key(tubes), g) < g:
+            continue
+        if is_solved(tubes, per_color):
+            return _path(parents, tubes)
+        for src, dst in successors(tubes, capacity):
+            child = _apply(tubes, src, dst)
+            key = canonical_key(child)
+            child_g = g + 1
+            if best_g.get(key, child_g + 1) <= child_g:
+                continue
+            child_f = child_g + heuristic(child)
+            if bound is not None and child_f > bound:
+                continue
+            best_g[key] = child_g
+            parents[child] = (tubes, (src, dst))
+            heapq.heappush(heap, (child_f, child_g, next(counter), child))
+        if len(best_g) > max_states:
+            raise SearchLimitExceeded(f"A* expanded past {max_states} states")
+    return None
+
+
+def _path(parents, tubes):
+    moves = []
+    while parents[tubes] is not None:
+        tubes, move = parents[tubes]
+        moves.append(move)
+    moves.reverse()
+    return moves
+
+
+def _idastar(board, bound, max_states):
+    per_color = board.per_color
+    capacity = board.capacity
+    path = []
+    # Transposition table: smallest depth a canonical position was reached at
+    # during the current iteration. Cleared when it outgrows max_states.
+    seen = {}
+
+    def search(tubes, g, limit):
+        f = g + heuristic(tubes)
+        if f > limit:
+            return f
+        if is_solved(tubes, per_color):
+            return True
+        key = canonical_key(tubes)
+        if seen.get(key, g + 1) <= g:
+            return float("inf")
+        if len(seen) >= max_states:
+            seen.clear()
+        seen[key] = g
+        smallest = float("inf")
+        for src, dst in successors(tubes, capacity):
+            path.append((src, dst))
+            result = search(_apply(tubes, src, dst), g + 1, limit)
+            if result is True:
+                return True
+            path.pop()
+            smallest = min(smallest, result)
+        return smallest
+
+    limit = heuristic(board.tubes)
+    while bound is None or limit <= bound:
+        seen.clear()
+        result = search(board.tubes, 0, limit)
+        if result is True:
+            return list(path)
+        if result == float("inf"):
+            return None
+        limit = result
+    return None
+
+
+# Shortest solution length for a board, or None if it has no solution within
+# bound moves.
+def optimal_length(board, bound=None, max_states=2_000_000):
+    moves = solve(board, bound, max_states)
+    return None if moves is None else len(moves)
+
+
+# Whether a board can be won inside a level's move_limit (None means no limit).
+def meets_move_limit(board, move_limit, max_states=2_000_000):
+    return solve(board, move_limit, max_states) is not None
+
+
+# Report how many random deals of each level can be won within its move_limit:
+#   python solver.py [deals_per_level]
+if __name__ == "__main__":
+    deals_per_level = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for level, level_data in enumerate(LEVELS, start=1):
+        lengths = []
+        for seed in range(deals_per_level):
+            board = deal(level_data, random.Random(seed))
+            lengths.append(optimal_length(board, level_data["move_limit"]))
+        solvable = [length for length in lengths if length is not None]
+        shortest = min(solvable) if solvable else "-"
+        print(f"Level {level}: {len(solvable)}/{deals_per_level} deals winnable within move limit "
+              f"{level_data['move_limit']} (shortest {shortest})")
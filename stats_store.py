@@ -0,0 +1,188 @@
+# Persistent player progress, results and leaderboards in SQLite.
+# Writes are queued and applied by a background thread, many per transaction,
+# so recording a result never blocks a frame. Reads go through their own
+# connection (the database runs in WAL mode, so they don't wait on the writer)
+# and are all index lookups: a player's progress, best times, the top N for a
+# level, and a player's rank, which stay fast with millions of results.
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from replay import WIN
+
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "progress.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    level INTEGER NOT NULL DEFAULT 1,
+    lives INTEGER NOT NULL DEFAULT 1,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    seed INTEGER NOT NULL,  -- which deal: the deal file's seed, or the one it was generated from
+    outcome INTEGER NOT NULL,
+    time_ms INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    played_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_player ON results (player_id, level);
+-- Partial index over wins (outcome 1, replay.WIN) for per-deal records
+CREATE INDEX IF NOT EXISTS results_seed_wins ON results (level, seed, time_ms) WHERE outcome = 1;
+CREATE TABLE IF NOT EXISTS best_times (
+    level INTEGER NOT NULL,
+    player_id INTEGER NOT NULL,
+    time_ms INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    PRIMARY KEY (level, player_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS best_times_rank ON best_times (level, time_ms);
+"""
+
+INSERT_RESULT = ("INSERT INTO results (player_id, level, seed, outcome, time_ms, moves, played_at) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)")
+UPSERT_BEST = ("INSERT INTO best_times (level, player_id, time_ms, moves) VALUES (?, ?, ?, ?) "
+               "ON CONFLICT (level, player_id) DO UPDATE SET time_ms = excluded.time_ms, moves = excluded.moves "
+               "WHERE excluded.time_ms < best_times.time_ms")
+UPSERT_PROGRESS = ("INSERT INTO players (name, level, lives, updated) VALUES (?, ?, ?, ?) "
+                   "ON CONFLICT (name) DO UPDATE SET level = excluded.level, lives = excluded.lives, "
+                   "updated = excluded.updated")
+
+
+def connect(path):
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute("PRAGMA cache_size = -32768")  # 32 MB keeps index pages hot during bulk loads
+    return db
+
+
+class StatsStore:
+    def __init__(self, path=STORE_FILE, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        db = connect(path)
+        db.executescript(SCHEMA)
+        db.commit()
+        self.reader = db
+        self.player_ids = {}
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="stats-writer", daemon=True)
+        self.writer.start()
+
+    # Queued writes
+
+    def record_result(self, player, level, seed, outcome, time_ms, moves):
+        self.queue.put(("result", (player, level, seed, outcome, time_ms, moves, time.time())))
+
+    def save_progress(self, player, level, lives):
+        self.queue.put(("progress", (player, level, lives, time.time())))
+
+    # Wait until everything queued so far is written
+    def flush(self):
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        done.wait()
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        self.reader.close()
+
+    def _player_id(self, db, name):
+        player_id = self.player_ids.get(name)
+        if player_id is None:
+            db.execute("INSERT OR IGNORE INTO players (name) VALUES (?)", (name,))
+            player_id = db.execute("SELECT id FROM players WHERE name = ?", (name,)).fetchone()[0]
+            self.player_ids[name] = player_id
+        return player_id
+
+    def _write_loop(self):
+        db = connect(self.path)
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            flushed = []
+            with db:
+                for item in batch:
+                    if item is None:
+                        running = False
+                    elif item[0] == "flush":
+                        flushed.append(item[1])
+                    elif item[0] == "progress":
+                        db.execute(UPSERT_PROGRESS, item[1])
+                    else:
+                        player, level, seed, outcome, time_ms, moves, played_at = item[1]
+                        player_id = self._player_id(db, player)
+                        db.execute(INSERT_RESULT, (player_id, level, seed, outcome, time_ms, moves, played_at))
+                        if outcome == WIN:
+                            db.execute(UPSERT_BEST, (level, player_id, time_ms, moves))
+            for done in flushed:
+                done.set()
+        db.close()
+
+    # Direct bulk load, for imports and benchmarks: rows are
+    # (player, level, seed, outcome, time_ms, moves, played_at)
+    def bulk_insert(self, rows):
+        self.flush()
+        db = self.reader
+        with db:
+            results = []
+            bests = {}
+            for player, level, seed, outcome, time_ms, moves, played_at in rows:
+                player_id = self._player_id(db, player)
+                results.append((player_id, level, seed, outcome, time_ms, moves, played_at))
+                if outcome == WIN:
+                    best = bests.get((level, player_id))
+                    if best is None or time_ms < best[2]:
+                        bests[(level, player_id)] = (level, player_id, time_ms, moves)
+            db.executemany(INSERT_RESULT, results)
+            db.executemany(UPSERT_BEST, bests.values())
+
+    # Reads
+
+    # (level, lives) the player last reached, or None for a new player
+    def progress(self, player):
+        return self.reader.execute("SELECT level, lives FROM players WHERE name = ? AND updated IS NOT NULL",
+                                   (player,)).fetchone()
+
+    def best_time(self, player, level):
+        row = self.reader.execute("SELECT b.time_ms FROM best_times b JOIN players p ON p.id = b.player_id "
+                                  "WHERE b.level = ? AND p.name = ?", (level, player)).fetchone()
+        return row[0] if row else None
+
+    # Fastest players on a level: [(name, time_ms, moves)]
+    def leaderboard(self, level, limit=10):
+        return self.reader.execute("SELECT p.name, b.time_ms, b.moves FROM best_times b "
+                                   "JOIN players p ON p.id = b.player_id WHERE b.level = ? "
+                                   "ORDER BY b.time_ms LIMIT ?", (level, limit)).fetchall()
+
+    # 1-based leaderboard position the player holds on a level, or would hold
+    # with time_ms if that is given
+    def rank(self, player, level, time_ms=None):
+        if time_ms is None:
+            time_ms = self.best_time(player, level)
+            if time_ms is None:
+                return None
+        row = self.reader.execute("SELECT id FROM players WHERE name = ?", (player,)).fetchone()
+        faster = self.reader.execute("SELECT COUNT(*) FROM best_times WHERE level = ? AND time_ms < ? AND player_id != ?",
+                                     (level, time_ms, row[0] if row else -1)).fetchone()[0]
+        return faster + 1
+
+    # Fastest wins of one particular deal: [(name, time_ms, moves)]
+    def best_for_seed(self, level, seed, limit=10):
+        return self.reader.execute("SELECT p.name, r.time_ms, r.moves FROM results r "
+                                   "JOIN players p ON p.id = r.player_id "
+                                   "WHERE r.level = ? AND r.seed = ? AND r.outcome = 1 "
+                                   "ORDER BY r.time_ms LIMIT ?", (level, seed, limit)).fetchall()
@@ -0,0 +1,251 @@
+# Deal-space survey: how hard each level really is.
+# Deals are drawn by seed, exactly as the game draws them, and every one is
+# solved across a process pool. Per deal the survey records the optimal move
+# count, whether the deal can be won at all, whether a stuck position can be
+# reached from it, and how many first moves it offers. Rows are appended to a
+# CSV a block at a time, so a long run can be stopped and picked up again
+# later with the same --first-seed and --max-states (a rerun that doesn't
+# match the rows already there is refused). The report at the end covers
+# every row in the file:
+#   python survey.py --deals 100000 --levels 1-10 --output survey.csv
+#   python survey.py --report-only --output survey.csv
+# The report flags levels whose move_limit cuts off many winnable deals or
+# puts no pressure on the player at all.
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import deal
+from level_generator import scramble
+from levels import LEVELS
+from solver import SearchLimitExceeded, canonical_key, solve
+
+SURVEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "survey.csv")
+COLUMNS = ["source", "level", "seed", "optimal", "solvable", "stuck_reachable", "branching", "max_states"]
+BLOCK = 2000  # Deals solved between writes; also the resume granularity
+
+# A limit is too tight when more than this share of winnable deals can't be
+# won inside it, and too loose when it is over this many times the p90
+TIGHT_SHARE = 0.05
+LOOSE_FACTOR = 2.0
+
+
+def draw_deal(source, level, seed):
+    level_data = LEVELS[level - 1]
+    rng = random.Random(seed)
+    if source == "scramble":
+        return scramble(level_data, rng, 4 * len(level_data["colors"]) * level_data["balls_per_color"])
+    return deal(level_data, rng)
+
+
+# Depth-first search for a stuck position. Returns True or False, or None if
+# max_states positions were seen without an answer.
+def stuck_reachable(board, max_states):
+    seen = {canonical_key(board.tubes)}
+    stack = [board]
+    while stack:
+        board = stack.pop()
+        if board.is_stuck() and not board.is_solved():
+            return True
+        for src, dst in board.legal_moves():
+            child = board.apply_move(src, dst)
+            key = canonical_key(child.tubes)
+            if key not in seen:
+                if len(seen) >= max_states:
+                    return None
+                seen.add(key)
+                stack.append(child)
+    return False
+
+
+def survey_deal(job):
+    source, level, seed, max_states = job
+    board = draw_deal(source, level, seed)
+    try:
+        moves = solve(board, max_states=max_states, exhaustive=False)
+        optimal = "" if moves is None else len(moves)
+        solvable = int(moves is not None)
+    except SearchLimitExceeded:
+        optimal = solvable = ""
+    stuck = stuck_reachable(board, max_states // 10)
+    return [source, level, seed, optimal, solvable, "" if stuck is None else int(stuck), len(board.legal_moves()),
+            max_states]
+
+
+# Drop a line cut short by an interrupted run, so appending starts on a
+# clean line. Only the tail of the file is read, a block at a time.
+def trim_partial_line(path, block=4096):
+    with open(path, "rb+") as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            data = f.read(pos - start)
+            if pos == end and data.endswith(b"\n"):
+                return
+            cut = data.rfind(b"\n")
+            if cut != -1:
+                f.truncate(start + cut + 1)
+                return
+            pos = start
+        f.truncate(0)
+
+
+# Rows already in the file, per (source, level): [lowest seed, highest seed,
+# row count, set of max_states values]
+def recorded_runs(path):
+    runs = {}
+    if not os.path.exists(path):
+        return runs
+    trim_partial_line(path)
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is not None and reader.fieldnames != COLUMNS:
+            raise ValueError(f"{path} has columns {reader.fieldnames}, not {COLUMNS}; survey into a new file")
+        for row in reader:
+            seed = int(row["seed"])
+            run = runs.setdefault((row["source"], int(row["level"])), [seed, seed, 0, set()])
+            run[0] = min(run[0], seed)
+            run[1] = max(run[1], seed)
+            run[2] += 1
+            run[3].add(int(row["max_states"]))
+    return runs
+
+
+# First seed still to survey for each level. The rows already there must be
+# the unbroken run of seeds from first_seed, solved with the same max_states,
+# or appending to them would mix seeds or search caps without saying so.
+def resume_seeds(path, source, levels, first_seed, max_states):
+    runs = recorded_runs(path)
+    seeds = {}
+    for level in levels:
+        run = runs.get((source, level))
+        if run is None:
+            seeds[level] = first_seed
+            continue
+        low, high, count, caps = run
+        if low != first_seed:
+            raise ValueError(f"level {level} rows start at seed {low}, not --first-seed {first_seed}")
+        if count != high - low + 1:
+            raise ValueError(f"level {level} has {count} rows for seeds {low}-{high}; the run is not contiguous")
+        if caps != {max_states}:
+            raise ValueError(f"level {level} was surveyed with --max-states {sorted(caps)}, not {max_states}")
+        seeds[level] = high + 1
+    return seeds
+
+
+def run_survey(path, source, levels, deals, first_seed, max_states, workers):
+    resume = resume_seeds(path, source, levels, first_seed, max_states)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(COLUMNS)
+        for level in levels:
+            start = resume[level]
+            end = first_seed + deals
+            if start < end:
+                print(f"Level {level}: surveying seeds {start}-{end - 1}", file=sys.stderr)
+            for block_start in range(start, end, BLOCK):
+                jobs = [(source, level, seed, max_states) for seed in range(block_start, min(end, block_start + BLOCK))]
+                writer.writerows(pool.map(survey_deal, jobs, chunksize=max(1, len(jobs) // 64)))
+                f.flush()
+
+
+# Percentile of a Counter of values, picked the same way as from the sorted
+# list of every value
+def percentile(histogram, p):
+    total = sum(histogram.values())
+    index = min(total - 1, int(p / 100 * total))
+    for value in sorted(histogram):
+        index -= histogram[value]
+        if index < 0:
+            return value
+
+
+def report(path, source):
+    stats = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["source"] != source:
+                continue
+            level = stats.setdefault(int(row["level"]), {"deals": 0, "optimal": Counter(), "unsolvable": 0,
+                                                         "unknown": 0, "stuck": 0, "stuck_known": 0, "branching": 0})
+            level["deals"] += 1
+            if row["optimal"]:
+                level["optimal"][int(row["optimal"])] += 1
+            elif row["solvable"] == "0":
+                level["unsolvable"] += 1
+            else:
+                level["unknown"] += 1
+            if row["stuck_reachable"]:
+                level["stuck_known"] += 1
+                level["stuck"] += int(row["stuck_reachable"])
+            level["branching"] += int(row["branching"])
+
+    for number in sorted(stats):
+        level = stats[number]
+        deals = level["deals"]
+        optimal = level["optimal"]  # optimal length -> deals
+        winnable = sum(optimal.values())
+        move_limit = LEVELS[number - 1]["move_limit"]
+        print(f"Level {number}: {deals} deals, {winnable / deals:.1%} winnable, "
+              f"{level['unsolvable'] / deals:.1%} forced dead ends, {level['unknown'] / deals:.1%} too big to solve")
+        if level["stuck_known"]:
+            print(f"  stuck position reachable in {level['stuck'] / level['stuck_known']:.1%} of deals, "
+                  f"first-move branching {level['branching'] / deals:.2f}")
+        if not optimal:
+            print(f"  move_limit {move_limit}: no winnable deals to judge it by")
+            continue
+        p10, p50, p90, p95 = (percentile(optimal, p) for p in (10, 50, 90, 95))
+        print(f"  optimal moves min {min(optimal)} p10 {p10} p50 {p50} p90 {p90} p95 {p95} max {max(optimal)}")
+        suggested = math.ceil(p95 * 1.25)
+        if move_limit is None:
+            print(f"  no move_limit; {suggested} would leave 25% slack over p95")
+            continue
+        over = sum(count for length, count in optimal.items() if length > move_limit) / winnable
+        if over > TIGHT_SHARE:
+            verdict = f"TOO TIGHT: {over:.1%} of winnable deals need more than {move_limit} moves"
+        elif move_limit > LOOSE_FACTOR * p90:
+            verdict = f"TOO LOOSE: over {LOOSE_FACTOR:g}x the p90 optimal of {p90}"
+        else:
+            verdict = "ok"
+        print(f"  move_limit {move_limit}: {verdict} (suggested {suggested})")
+
+
+def parse_levels(text):
+    if "-" in text:
+        first, last = text.split("-")
+        return list(range(int(first), int(last) + 1))
+    return [int(part) for part in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Survey deal difficulty for every level.")
+    parser.add_argument("--deals", type=int, default=1000, help="deals per level (total, including earlier runs)")
+    parser.add_argument("--levels", default=f"1-{len(LEVELS)}", help="e.g. 1-10 or 4,5,6")
+    parser.add_argument("--source", choices=("shuffle", "scramble"), default="shuffle",
+                        help="the game's live shuffle, or the generator's reverse scramble")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--max-states", type=int, default=200_000, help="search cap per deal")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--output", default=SURVEY_FILE)
+    parser.add_argument("--report-only", action="store_true")
+    args = parser.parse_args()
+
+    if not args.report_only:
+        try:
+            run_survey(args.output, args.source, parse_levels(args.levels), args.deals, args.first_seed,
+                       args.max_states, args.workers)
+        except ValueError as exc:
+            parser.error(f"can't resume {args.output}: {exc}")
+    report(args.output, args.source)
+
+
+if __name__ == "__main__":
+    main()
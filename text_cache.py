@@ -0,0 +1,109 @@
+# Text layout and surface cache.
+# Rendered strings are kept in an LRU keyed by (font, text, color), word-wrap
+# layouts are computed once per (font, text, width), and numbers that change
+# every frame (the timer and move counter) are composed from a glyph atlas
+# instead of going through the font renderer again. Those compositions stay
+# out of the LRU: only the last one per HUD field is kept.
+from collections import OrderedDict
+
+import pygame
+
+
+# One strip surface holding every glyph rendered so far for a font and color.
+# Characters not seen before are rendered once and appended to the strip.
+class GlyphAtlas:
+    def __init__(self, font, color, chars="0123456789.:"):
+        self.font = font
+        self.color = color
+        self.height = font.get_height()
+        self.surface = pygame.Surface((1, self.height), pygame.SRCALPHA)
+        self.glyphs = {}
+        self.add(chars)
+
+    def add(self, chars):
+        new_chars = [char for char in dict.fromkeys(chars) if char not in self.glyphs]
+        if not new_chars:
+            return
+        rendered = [self.font.render(char, True, self.color) for char in new_chars]
+        x = self.surface.get_width()
+        grown = pygame.Surface((x + sum(surface.get_width() for surface in rendered), self.height), pygame.SRCALPHA)
+        grown.blit(self.surface, (0, 0))
+        for char, surface in zip(new_chars, rendered):
+            grown.blit(surface, (x, 0))
+            self.glyphs[char] = pygame.Rect(x, 0, surface.get_width(), surface.get_height())
+            x += surface.get_width()
+        self.surface = grown
+
+    def render(self, text):
+        self.add(text)
+        rects = [self.glyphs[char] for char in text]
+        result = pygame.Surface((max(1, sum(rect.width for rect in rects)), self.height), pygame.SRCALPHA)
+        # Start from the text color at zero alpha so glyph edges blend cleanly
+        result.fill((*self.color[:3], 0))
+        blits = []
+        x = 0
+        for rect in rects:
+            blits.append((self.surface, (x, 0), rect))
+            x += rect.width
+        result.blits(blits, doreturn=False)
+        return result
+
+
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.layouts = {}
+        self.atlases = {}
+        self.fields = {}  # field -> ((font, text, color), surface) last composed
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    # Word-wrap text into lines narrower than width, measured with font.size
+    def wrap(self, font, text, width):
+        key = (font, text, width)
+        lines = self.layouts.get(key)
+        if lines is None:
+            lines = []
+            current_line = ""
+            for word in text.split():
+                test_line = current_line + " " + word if current_line else word
+                if font.size(test_line)[0] < width:
+                    current_line = test_line
+                else:
+                    lines.append(current_line)
+                    current_line = word
+            if current_line:
+                lines.append(current_line)
+            self.layouts[key] = lines
+        return lines
+
+    def atlas(self, font, color):
+        key = (font, color)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            atlas = self.atlases[key] = GlyphAtlas(font, color)
+        return atlas
+
+    # For short strings that change often, like numbers: composed from the
+    # atlas instead of the font renderer. A new value replaces the field's
+    # last surface rather than taking an LRU slot; an unchanged one returns
+    # the same surface, so the HUD sees nothing to repaint.
+    def render_glyphs(self, font, text, color, field=None):
+        key = (font, text, color)
+        last = self.fields.get(field)
+        if last is not None and last[0] == key:
+            return last[1]
+        surface = self.atlas(font, color).render(text)
+        self.fields[field] = (key, surface)
+        return surface